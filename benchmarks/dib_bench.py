@@ -0,0 +1,78 @@
+"""
+Time and peak memory of building the CF_DIB clipboard payload for one frame.
+
+    python benchmarks/dib_bench.py
+
+Compares encode_dib with the BMP save-and-slice it replaced, on a 4K frame
+and on desktops of one to three 1080p monitors.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from benchmarks.session_bench import synthetic_frame
+from src.encoding import encode_dib
+
+FRAMES = (
+    ("4K", 3840, 2160),
+    ("1x1080p", 1920, 1080),
+    ("2x1080p", 3840, 1080),
+    ("3x1080p", 5760, 1080),
+)
+
+
+def bmp_slice(image) -> bytes:
+    """The previous path: a full BMP file in memory minus its 14-byte file header."""
+    output = io.BytesIO()
+    image.convert("RGB").save(output, "BMP")
+    data = output.getvalue()[14:]
+    output.close()
+    return data
+
+
+def measure(fn, image, repeat: int):
+    """Fastest time in ms over repeat runs, and peak traced allocation in MB of one run."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(image)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    del result
+    tracemalloc.start()
+    fn(image)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best * 1000, peak / 1048576
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare CF_DIB builders.")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement; the fastest is kept")
+    args = parser.parse_args()
+
+    header = f"{'frame':<10}{'MB':>7}{'bmp ms':>9}{'bmp peak':>10}{'dib ms':>9}{'dib peak':>10}{'speedup':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, width, height in FRAMES:
+        image = synthetic_frame(width, height, 1)
+        if encode_dib(image) != bmp_slice(image):
+            print(f"{name}: payloads differ", file=sys.stderr)
+        old_ms, old_peak = measure(bmp_slice, image, args.repeat)
+        new_ms, new_peak = measure(encode_dib, image, args.repeat)
+        size_mb = len(encode_dib(image)) / 1048576
+        print(f"{name:<10}{size_mb:>7.1f}{old_ms:>9.1f}{old_peak:>10.1f}{new_ms:>9.1f}{new_peak:>10.1f}"
+              f"{old_ms / new_ms:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Bytes and encode time per output format over a corpus of frames.
+
+    python benchmarks/format_bench.py                     # synthetic corpus
+    python benchmarks/format_bench.py --corpus DIR        # every image in DIR
+
+Also reports what image_format: auto would pick for each frame.
+"""
+import argparse
+import os
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from PIL import Image, ImageDraw, features
+
+from benchmarks.session_bench import synthetic_frame
+from src.encoding import EncodeSettings, encode_frame, encode_image, fit_width, is_flat
+
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg", ".bmp", ".webp", ".tif", ".tiff")
+
+
+def flat_ui_frame(width: int, height: int) -> Image.Image:
+    """Dialog-style frame: solid panels, buttons and one line of text per row."""
+    image = Image.new("RGB", (width, height), (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, width, 40), fill=(0, 120, 215))
+    for i, y in enumerate(range(80, height - 60, 36)):
+        draw.text((40, y), f"Field {i}: value {i * 37 % 1000}", fill=(20, 20, 20))
+        draw.rectangle((width // 2, y - 4, width - 60, y + 20), outline=(160, 160, 160))
+    draw.rectangle((width - 220, height - 50, width - 40, height - 15), fill=(225, 225, 225))
+    return image
+
+
+def synthetic_corpus(width: int, height: int):
+    yield "flat-ui", flat_ui_frame(width, height)
+    yield "text-rows", synthetic_frame(width, height, 1)
+    noise = [Image.effect_noise((width, height), 40 + 10 * i) for i in range(3)]
+    gradient = Image.linear_gradient("L").resize((width, height))
+    photo = Image.merge("RGB", [Image.blend(n, gradient.rotate(90 * i), 0.6) for i, n in enumerate(noise)])
+    yield "photo", photo
+
+
+def file_corpus(directory: str):
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(IMAGE_SUFFIXES):
+            with Image.open(os.path.join(directory, name)) as img:
+                img.load()
+                yield name, img.convert("RGB")
+
+
+def timed(fn, repeat: int):
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare output formats on a corpus of frames.")
+    parser.add_argument("--corpus", help="directory of screenshots (default: synthetic frames)")
+    parser.add_argument("--size", default="1920x1080", help="synthetic frame size, WIDTHxHEIGHT")
+    parser.add_argument("--max-width", type=int, default=0, help="downscale first, as docx_dpi would")
+    parser.add_argument("--budget-ms", type=float, default=40, help="time budget for the auto mode")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement; the fastest is kept")
+    args = parser.parse_args()
+
+    formats = ["jpeg", "png"] + (["webp"] if features.check("webp") else [])
+    if args.corpus:
+        corpus = file_corpus(args.corpus)
+    else:
+        width, height = (int(v) for v in args.size.lower().split("x"))
+        corpus = synthetic_corpus(width, height)
+
+    header = f"{'frame':<20}{'class':<7}" + "".join(f"{f + ' KB':>11}{f + ' ms':>10}" for f in formats) \
+        + f"{'auto':>7}{'auto KB':>10}{'auto ms':>10}"
+    print(header)
+    print("-" * len(header))
+    totals = {f: [0, 0.0] for f in formats + ["auto"]}
+    for name, frame in corpus:
+        frame = fit_width(frame, args.max_width or None)
+        row = f"{name[:19]:<20}{'flat' if is_flat(frame) else 'photo':<7}"
+        for fmt in formats:
+            data, ms = timed(lambda: encode_image(frame, fmt), args.repeat)
+            totals[fmt][0] += len(data)
+            totals[fmt][1] += ms
+            row += f"{len(data) / 1024:>11.1f}{ms:>10.1f}"
+        settings = EncodeSettings(tuple(formats), args.budget_ms / 1000)
+        (data, picked), ms = timed(lambda: encode_frame(frame, settings), args.repeat)
+        totals["auto"][0] += len(data)
+        totals["auto"][1] += ms
+        print(row + f"{picked:>7}{len(data) / 1024:>10.1f}{ms:>10.1f}")
+
+    print("-" * len(header))
+    row = f"{'total':<27}" + "".join(f"{totals[f][0] / 1024:>11.1f}{totals[f][1]:>10.1f}" for f in formats)
+    print(row + f"{'':>7}{totals['auto'][0] / 1024:>10.1f}{totals['auto'][1]:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
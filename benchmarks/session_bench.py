@@ -0,0 +1,348 @@
+"""
+Headless benchmark for the capture pipeline.
+
+Drives ScreenshotSession with synthetic frames and fake clipboard and
+window-title backends, so it runs on any platform, including plain Linux:
+
+    python benchmarks/session_bench.py
+    python benchmarks/session_bench.py --workload capture --mode docx --rate 10 --count 300
+
+Without --workload every workload runs against both save modes, each in
+its own process so peak RSS is measured per run.
+"""
+import argparse
+import json
+import os
+import queue
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from PIL import Image, ImageDraw
+
+from src.capture import CaptureBackend
+from src.encoding import shutdown_encoder_pool
+from src.workers import shutdown_session_executor
+from src.engine import DEFAULT_GROUP_COMMIT_MS, ScreenshotSession
+
+WORKLOADS = ("capture", "undo", "redo", "prepend", "rotate")
+MODES = ("docx", "folder")
+
+# Operations replayed by each workload, repeated until --count captures are queued
+PATTERNS = {
+    "capture": ["capture"],
+    "undo": ["capture", "capture", "capture", "undo"],
+    "redo": ["capture", "capture", "undo", "undo", "redo", "redo"],
+    "prepend": ["capture", "capture", "prepend"],
+    "rotate": ["capture"] * 9 + ["capture", "rotate"],
+}
+
+
+def synthetic_frame(width: int, height: int, seed: int) -> Image.Image:
+    """A screen-like frame: flat window chrome, rows of text-like marks and a photo region."""
+    rng = random.Random(seed)
+    image = Image.new("RGB", (width, height), (240, 240, 240))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, width, 32), fill=(30, 60, 120))
+    draw.rectangle((0, 32, width // 6, height), fill=(225, 228, 232))
+    for y in range(48, height - 16, 18):
+        x = width // 6 + 16
+        while x < width - 96:
+            w = rng.randint(12, 80)
+            shade = rng.randint(0, 90)
+            draw.rectangle((x, y, x + w, y + 10), fill=(shade, shade, shade))
+            x += w + rng.randint(4, 12)
+    photo = Image.effect_noise((max(1, width // 4), max(1, height // 4)), 40 + seed).convert("RGB")
+    image.paste(photo, (width // 2, height // 2))
+    return image
+
+
+class FakeBackend(CaptureBackend):
+    """
+    A row of identical monitors showing pre-rendered frames. The foreground
+    window is always on the last monitor.
+    """
+
+    name = "fake"
+
+    def __init__(self, width: int, height: int, monitors: int = 1, distinct: int = 8):
+        self.width = width
+        self.height = height
+        self.monitors = monitors
+        self.frames = [synthetic_frame(width * monitors, height, i) for i in range(distinct)]
+        self.calls = 0
+
+    def grab(self, bbox=None) -> Image.Image:
+        frame = self.frames[self.calls % len(self.frames)]
+        self.calls += 1
+        return frame.crop(bbox) if bbox else frame.copy()
+
+    def foreground_monitor(self):
+        left = self.width * (self.monitors - 1)
+        return left, 0, left + self.width, self.height
+
+    def foreground_window(self):
+        # A typical application window, 60% of the monitor
+        left, top, right, bottom = self.foreground_monitor()
+        inset_x, inset_y = self.width // 5, self.height // 5
+        return left + inset_x, top + inset_y, right - inset_x, bottom - inset_y
+
+
+class FakeClipboard:
+    """Stands in for the win32clipboard module; keeps the data last set for each format."""
+
+    CF_TEXT = 1
+    CF_DIB = 8
+    CF_UNICODETEXT = 13
+    CF_HDROP = 15
+
+    def __init__(self):
+        self.data = {}
+        self._lock = threading.Lock()
+
+    def OpenClipboard(self):
+        self._lock.acquire()
+
+    def CloseClipboard(self):
+        self._lock.release()
+
+    def EmptyClipboard(self):
+        self.data = {}
+
+    def SetClipboardData(self, fmt, data):
+        self.data[fmt] = data
+
+    def GetClipboardData(self, fmt):
+        return self.data[fmt]
+
+    def IsClipboardFormatAvailable(self, fmt):
+        return fmt in self.data
+
+    def set_text(self, text: str):
+        with self._lock:
+            self.data = {self.CF_UNICODETEXT: text}
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process, or None where it cannot be read."""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return peak if sys.platform == "darwin" else peak * 1024
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class _Counters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = _Counters()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                 ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize
+    except Exception:
+        return None
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def session_config(args, save_dir: str) -> dict:
+    return {
+        "filename": "bench",
+        "save_dir": save_dir,
+        "save_mode": args.mode,
+        "target_file": None,
+        "start_count": 0,
+        "log_title": True,
+        "append_num": True,
+        "auto_copy": args.auto_copy,
+        "copy_files": True,
+        "copy_image": True,
+        "max_size": str(args.max_size if args.workload == "rotate" else 0),
+        "group_commit": True,
+        "group_commit_ms": args.group_commit_ms,
+        "max_pending_mb": 512,
+        "parallel_encode": args.parallel_encode,
+        "folder_reconcile_s": 60,
+        "dedupe_mode": "off",
+        "dedupe_threshold": 2,
+        "metrics_file": "",
+        "capture_mode": args.capture_mode,
+        "capture_region": args.region,
+        "docx_dpi": args.docx_dpi,
+        "journal_dir": os.path.join(save_dir, "journal"),
+        "fsync": args.fsync,
+    }
+
+
+def run_workload(args) -> dict:
+    """Replays one workload against one save mode and returns its measurements."""
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    backend = FakeBackend(width, height, args.monitors)
+    clipboard = FakeClipboard()
+    titles = iter(range(1, 1 << 30))
+    save_dir = tempfile.mkdtemp(prefix="click_bench_")
+
+    session = ScreenshotSession(session_config(args, save_dir), queue.Queue(), capture_backend=backend,
+                                clipboard=clipboard, window_title=lambda: f"Window {next(titles)} - Benchmark")
+    try:
+        pattern = PATTERNS[args.workload]
+        interval = 1.0 / args.rate if args.rate > 0 else 0.0
+        captures = 0
+        ops = 0
+        started = time.perf_counter()
+        while captures < args.count:
+            op = pattern[ops % len(pattern)]
+            if interval:
+                delay = started + ops * interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            ops += 1
+
+            if op == "capture":
+                session.capture(hotkey_at=time.perf_counter())
+                captures += 1
+            elif op == "undo":
+                session.undo()
+            elif op == "redo":
+                session.redo()
+            elif op == "prepend":
+                clipboard.set_text(f"Step {ops}: expected result")
+                session.prepend_selection()
+            elif op == "rotate":
+                session.manual_rotate()
+
+        session.save_queue.join()
+        session.clipboard_queue.join()
+        elapsed = time.perf_counter() - started
+        summary = session.metrics.summary()
+    finally:
+        session.cleanup()
+        if session.finish_thread:
+            session.finish_thread.join()
+        shutdown_encoder_pool()
+        shutdown_session_executor()
+
+    output_bytes = directory_size(save_dir)
+    shutil.rmtree(save_dir, ignore_errors=True)
+
+    total = summary.get("total", (0.0, 0.0, 0.0))
+    peak_rss = peak_rss_bytes()
+    return {
+        "workload": args.workload,
+        "mode": args.mode,
+        "captures": captures,
+        "operations": ops,
+        "seconds": round(elapsed, 3),
+        "captures_per_s": round(captures / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {"p50": round(total[0], 1), "p95": round(total[1], 1), "p99": round(total[2], 1)},
+        "stages_ms": {stage: [round(v, 1) for v in values] for stage, values in summary.items()},
+        "peak_rss_mb": round(peak_rss / 1048576, 1) if peak_rss else None,
+        "output_mb": round(output_bytes / 1048576, 2),
+    }
+
+
+def run_all(args) -> list:
+    options = ["--count", str(args.count), "--rate", str(args.rate), "--size", args.size,
+               "--monitors", str(args.monitors), "--capture-mode", args.capture_mode, "--region", args.region,
+               "--max-size", str(args.max_size), "--docx-dpi", str(args.docx_dpi), "--group-commit-ms", str(args.group_commit_ms),
+               "--fsync", args.fsync]
+    if args.auto_copy:
+        options.append("--auto-copy")
+    if args.parallel_encode:
+        options.append("--parallel-encode")
+
+    results = []
+    for workload in WORKLOADS:
+        for mode in MODES:
+            if workload == "rotate" and mode == "folder":
+                # Folder sessions never rotate
+                continue
+            command = [sys.executable, os.path.abspath(__file__), "--workload", workload,
+                       "--mode", mode, "--json"] + options
+            completed = subprocess.run(command, capture_output=True, text=True)
+            if completed.returncode != 0:
+                print(f"{workload}/{mode} failed:\n{completed.stderr}", file=sys.stderr)
+                continue
+            results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    return results
+
+
+def print_table(results):
+    header = f"{'workload':<10}{'mode':<8}{'caps':>6}{'caps/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}" \
+             f"{'RSS MB':>9}{'out MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        latency = r["latency_ms"]
+        rss = f"{r['peak_rss_mb']:.1f}" if r["peak_rss_mb"] is not None else "n/a"
+        print(f"{r['workload']:<10}{r['mode']:<8}{r['captures']:>6}{r['captures_per_s']:>9.2f}"
+              f"{latency['p50']:>9.1f}{latency['p95']:>9.1f}{latency['p99']:>9.1f}{rss:>9}{r['output_mb']:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ScreenshotSession with synthetic frames.")
+    parser.add_argument("--workload", choices=WORKLOADS, help="run a single workload (default: all)")
+    parser.add_argument("--mode", choices=MODES, default="docx")
+    parser.add_argument("--count", type=int, default=100, help="captures per run")
+    parser.add_argument("--rate", type=float, default=5.0, help="operations per second, 0 for no pacing")
+    parser.add_argument("--size", default="1920x1080", help="size of one monitor, WIDTHxHEIGHT")
+    parser.add_argument("--monitors", type=int, default=1, help="monitors side by side")
+    parser.add_argument("--capture-mode", choices=("all_screens", "foreground_monitor", "active_window", "region"),
+                        default="all_screens")
+    parser.add_argument("--region", default="0,0,800,600", help="left,top,right,bottom for the region mode")
+    parser.add_argument("--max-size", type=float, default=5.0, help="rotation limit in MB for the rotate workload")
+    parser.add_argument("--group-commit-ms", type=float, default=DEFAULT_GROUP_COMMIT_MS)
+    parser.add_argument("--docx-dpi", type=float, default=0, help="downscale DOCX pictures to this DPI, 0 keeps full size")
+    parser.add_argument("--auto-copy", action="store_true", help="also publish every capture to the fake clipboard")
+    parser.add_argument("--parallel-encode", action="store_true")
+    parser.add_argument("--fsync", choices=("none", "rotation", "commit"), default="rotation",
+                        help="when DOCX commits are flushed to disk")
+    parser.add_argument("--json", action="store_true", help="print the result as one JSON line")
+    args = parser.parse_args()
+
+    if args.workload:
+        result = run_workload(args)
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print_table([result])
+            print(json.dumps(result["stages_ms"], indent=2))
+        return
+
+    results = run_all(args)
+    if args.json:
+        print(json.dumps(results))
+    else:
+        print_table(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import ctypes
+from ctypes import wintypes
+from typing import Optional, Tuple
+
+from PIL import Image, ImageGrab
+
+from src.hotkeys import user32
+
+# (left, top, right, bottom) in virtual-screen pixels
+Rect = Tuple[int, int, int, int]
+
+MONITOR_DEFAULTTONEAREST = 2
+DWMWA_EXTENDED_FRAME_BOUNDS = 9
+SM_XVIRTUALSCREEN = 76
+SM_YVIRTUALSCREEN = 77
+SM_CXVIRTUALSCREEN = 78
+SM_CYVIRTUALSCREEN = 79
+SRCCOPY = 0x00CC0020
+CAPTUREBLT = 0x40000000
+DIB_RGB_COLORS = 0
+
+gdi32 = ctypes.windll.gdi32 if hasattr(ctypes, "windll") else None
+dwmapi = ctypes.windll.dwmapi if hasattr(ctypes, "windll") else None
+
+
+class MONITORINFO(ctypes.Structure):
+    _fields_ = [("cbSize", wintypes.DWORD), ("rcMonitor", wintypes.RECT),
+                ("rcWork", wintypes.RECT), ("dwFlags", wintypes.DWORD)]
+
+
+class BITMAPINFOHEADER(ctypes.Structure):
+    _fields_ = [("biSize", wintypes.DWORD), ("biWidth", wintypes.LONG), ("biHeight", wintypes.LONG),
+                ("biPlanes", wintypes.WORD), ("biBitCount", wintypes.WORD), ("biCompression", wintypes.DWORD),
+                ("biSizeImage", wintypes.DWORD), ("biXPelsPerMeter", wintypes.LONG),
+                ("biYPelsPerMeter", wintypes.LONG), ("biClrUsed", wintypes.DWORD),
+                ("biClrImportant", wintypes.DWORD)]
+
+
+class CaptureBackend:
+    """
+    Grabs screen pixels for a session. bbox is a Rect in virtual-screen
+    coordinates; None means every monitor.
+    """
+
+    name = ""
+
+    def grab(self, bbox: Optional[Rect] = None) -> Image.Image:
+        raise NotImplementedError
+
+    def foreground_monitor(self) -> Optional[Rect]:
+        """Bounds of the monitor showing the foreground window, or None if unknown."""
+        try:
+            monitor = user32.MonitorFromWindow(user32.GetForegroundWindow(), MONITOR_DEFAULTTONEAREST)
+            info = MONITORINFO()
+            info.cbSize = ctypes.sizeof(MONITORINFO)
+            if not user32.GetMonitorInfoW(monitor, ctypes.byref(info)):
+                return None
+            r = info.rcMonitor
+            return r.left, r.top, r.right, r.bottom
+        except Exception:
+            return None
+
+    def foreground_window(self) -> Optional[Rect]:
+        """Visible bounds of the foreground window, clipped to the screen, or None."""
+        try:
+            return window_rect(user32.GetForegroundWindow())
+        except Exception:
+            return None
+
+
+class PilBackend(CaptureBackend):
+    """ImageGrab over the whole virtual screen, cropped to bbox."""
+
+    name = "pil"
+
+    def grab(self, bbox: Optional[Rect] = None) -> Image.Image:
+        return ImageGrab.grab(bbox=bbox, all_screens=True)
+
+
+class GdiBackend(CaptureBackend):
+    """
+    Copies only the requested rectangle out of the screen DC, so grabbing one
+    monitor costs one monitor's worth of pixels instead of the whole desktop.
+    """
+
+    name = "gdi"
+
+    def grab(self, bbox: Optional[Rect] = None) -> Image.Image:
+        left, top, right, bottom = bbox or virtual_screen()
+        width, height = right - left, bottom - top
+
+        screen_dc = user32.GetDC(None)
+        memory_dc = gdi32.CreateCompatibleDC(screen_dc)
+        bitmap = gdi32.CreateCompatibleBitmap(screen_dc, width, height)
+        previous = gdi32.SelectObject(memory_dc, bitmap)
+        try:
+            if not gdi32.BitBlt(memory_dc, 0, 0, width, height, screen_dc, left, top, SRCCOPY | CAPTUREBLT):
+                raise OSError("BitBlt failed")
+            # GetDIBits must not read a bitmap that is still selected into a DC
+            gdi32.SelectObject(memory_dc, previous)
+            previous = None
+            header = BITMAPINFOHEADER()
+            header.biSize = ctypes.sizeof(BITMAPINFOHEADER)
+            header.biWidth = width
+            header.biHeight = -height  # top-down rows
+            header.biPlanes = 1
+            header.biBitCount = 32
+            buffer = ctypes.create_string_buffer(width * height * 4)
+            if not gdi32.GetDIBits(memory_dc, bitmap, 0, height, buffer, ctypes.byref(header), DIB_RGB_COLORS):
+                raise OSError("GetDIBits failed")
+            return Image.frombuffer("RGB", (width, height), buffer, "raw", "BGRX", 0, 1)
+        finally:
+            if previous is not None:
+                gdi32.SelectObject(memory_dc, previous)
+            gdi32.DeleteObject(bitmap)
+            gdi32.DeleteDC(memory_dc)
+            user32.ReleaseDC(None, screen_dc)
+
+
+def virtual_screen() -> Rect:
+    """Bounds of the desktop spanning every monitor."""
+    left = user32.GetSystemMetrics(SM_XVIRTUALSCREEN)
+    top = user32.GetSystemMetrics(SM_YVIRTUALSCREEN)
+    return (left, top, left + user32.GetSystemMetrics(SM_CXVIRTUALSCREEN),
+            top + user32.GetSystemMetrics(SM_CYVIRTUALSCREEN))
+
+
+def window_rect(hwnd) -> Optional[Rect]:
+    """
+    Bounds of a window as drawn on screen, clipped to the desktop. DWM's frame
+    bounds leave out the invisible resize border that GetWindowRect includes.
+    """
+    if not hwnd or user32.IsIconic(hwnd):
+        return None
+    rect = wintypes.RECT()
+    if dwmapi.DwmGetWindowAttribute(hwnd, DWMWA_EXTENDED_FRAME_BOUNDS, ctypes.byref(rect), ctypes.sizeof(rect)) != 0:
+        if not user32.GetWindowRect(hwnd, ctypes.byref(rect)):
+            return None
+    screen = virtual_screen()
+    bounds = (max(rect.left, screen[0]), max(rect.top, screen[1]),
+              min(rect.right, screen[2]), min(rect.bottom, screen[3]))
+    if bounds[2] <= bounds[0] or bounds[3] <= bounds[1]:
+        return None
+    return bounds
+
+
+def parse_rect(value) -> Optional[Rect]:
+    """Reads a saved region, "left,top,right,bottom"; None if it is not a valid rectangle."""
+    try:
+        left, top, right, bottom = (int(float(v)) for v in str(value).split(","))
+    except (TypeError, ValueError):
+        return None
+    if right <= left or bottom <= top:
+        return None
+    return left, top, right, bottom
+
+
+def _declare_gdi_types():
+    # Handles are pointer-sized; the ctypes default of int would truncate them on 64-bit
+    handle = ctypes.c_void_p
+    user32.GetDC.restype = handle
+    user32.GetDC.argtypes = [handle]
+    user32.ReleaseDC.argtypes = [handle, handle]
+    user32.MonitorFromWindow.restype = handle
+    user32.MonitorFromWindow.argtypes = [handle, wintypes.DWORD]
+    user32.GetMonitorInfoW.argtypes = [handle, ctypes.POINTER(MONITORINFO)]
+    user32.GetForegroundWindow.restype = handle
+    user32.IsIconic.argtypes = [handle]
+    user32.GetWindowRect.argtypes = [handle, ctypes.POINTER(wintypes.RECT)]
+    dwmapi.DwmGetWindowAttribute.argtypes = [handle, wintypes.DWORD, ctypes.c_void_p, wintypes.DWORD]
+    gdi32.CreateCompatibleDC.restype = handle
+    gdi32.CreateCompatibleDC.argtypes = [handle]
+    gdi32.CreateCompatibleBitmap.restype = handle
+    gdi32.CreateCompatibleBitmap.argtypes = [handle, ctypes.c_int, ctypes.c_int]
+    gdi32.SelectObject.restype = handle
+    gdi32.SelectObject.argtypes = [handle, handle]
+    gdi32.BitBlt.argtypes = [handle, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                             handle, ctypes.c_int, ctypes.c_int, wintypes.DWORD]
+    gdi32.GetDIBits.argtypes = [handle, handle, wintypes.UINT, wintypes.UINT, ctypes.c_void_p,
+                                ctypes.POINTER(BITMAPINFOHEADER), wintypes.UINT]
+    gdi32.DeleteObject.argtypes = [handle]
+    gdi32.DeleteDC.argtypes = [handle]
+
+
+if gdi32 is not None:
+    _declare_gdi_types()
+
+BACKENDS = {PilBackend.name: PilBackend, GdiBackend.name: GdiBackend}
+
+
+def create_backend(name: str) -> CaptureBackend:
+    """Backend by config name; GDI is only available on Windows, PIL is the fallback."""
+    if name == GdiBackend.name and gdi32 is None:
+        name = PilBackend.name
+    return BACKENDS.get(name, PilBackend)()
@@ -0,0 +1,56 @@
+import os
+import struct
+import threading
+from typing import Iterable, List
+
+# DROPFILES: offset of the file list, drop point (x, y), non-client flag, wide characters
+DROPFILES_HEADER = struct.pack("<IiiII", 20, 0, 0, 0, 1)
+_TERMINATOR = "\0".encode("utf-16le")
+
+
+class FileDropList:
+    """
+    Absolute file paths with their CF_HDROP payload kept encoded.
+
+    The payload is the DROPFILES header, each path as UTF-16 followed by a
+    null, and a final null ending the list. Appending a path only encodes
+    that path, so a long cumulative list costs nothing extra per capture.
+    """
+
+    def __init__(self, paths: Iterable[str] = ()):
+        self._lock = threading.Lock()
+        self.paths: List[str] = []
+        self._payload = bytearray(DROPFILES_HEADER + _TERMINATOR)
+        for path in paths:
+            self.append(path)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def append(self, path: str):
+        path = os.path.abspath(path)
+        with self._lock:
+            self.paths.append(path)
+            # Drop the list terminator, add the path and its null, then end the list again
+            del self._payload[-len(_TERMINATOR):]
+            self._payload += (path + "\0\0").encode("utf-16le")
+
+    def remove(self, path: str):
+        """Removes a path, e.g. an undone capture. Rebuilds the payload; rare."""
+        path = os.path.abspath(path)
+        with self._lock:
+            if path not in self.paths:
+                return
+            self.paths.remove(path)
+            self._payload = bytearray(DROPFILES_HEADER + "".join(p + "\0" for p in self.paths).encode("utf-16le")
+                                      + _TERMINATOR)
+
+    def drop_payload(self) -> bytes:
+        """CF_HDROP data for the current list."""
+        with self._lock:
+            return bytes(self._payload)
+
+    def text(self) -> str:
+        """CF_UNICODETEXT fallback: one path per line."""
+        with self._lock:
+            return "\r\n".join(self.paths)
@@ -0,0 +1,56 @@
+"""
+Compacts every evidence document under a folder, dropping media that no
+picture uses any more.
+
+    python -m src.compact "C:\\Users\\me\\Desktop\\Evidence"
+    python -m src.compact DIR --dry-run      # only report what would be reclaimed
+"""
+import argparse
+import os
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.docx_writer import compact
+
+
+def find_documents(root: str):
+    for directory, _, files in os.walk(root):
+        for name in sorted(files):
+            # Skip Word's lock files for documents that are open
+            if name.lower().endswith(".docx") and not name.startswith("~$"):
+                yield os.path.join(directory, name)
+
+
+def _format_size(size):
+    return f"{size / 1024:.2f} KB" if size < 1048576 else f"{size / 1048576:.2f} MB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Remove unused media from the .docx files under a folder.")
+    parser.add_argument("save_dir", help="folder to search, including subfolders")
+    parser.add_argument("--dry-run", action="store_true", help="report without rewriting any file")
+    args = parser.parse_args()
+
+    total = 0
+    documents = 0
+    for path in find_documents(args.save_dir):
+        documents += 1
+        try:
+            reclaimed = compact(path, dry_run=args.dry_run)
+        except Exception as e:
+            print(f"{path}: Compact Error: {e}")
+            continue
+        if reclaimed:
+            total += reclaimed
+            print(f"{path}: {_format_size(reclaimed)}")
+
+    verb = "reclaimable" if args.dry_run else "reclaimed"
+    print(f"{documents} documents, {_format_size(total)} {verb}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,978 @@
+import io
+import os
+import posixpath
+import re
+import struct
+import threading
+import zipfile
+import zlib
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from lxml import etree
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+WP_NS = "http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing"
+A_NS = "http://schemas.openxmlformats.org/drawingml/2006/main"
+PIC_NS = "http://schemas.openxmlformats.org/drawingml/2006/picture"
+NSMAP = {"w": W_NS, "wp": WP_NS, "a": A_NS, "r": R_NS}
+IMAGE_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/image"
+
+CUSTOM_PROPS_NS = "http://schemas.openxmlformats.org/officeDocument/2006/custom-properties"
+VT_NS = "http://schemas.openxmlformats.org/officeDocument/2006/docPropsVTypes"
+CUSTOM_PROPS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/custom-properties"
+CUSTOM_PROPS_TYPE = "application/vnd.openxmlformats-officedocument.custom-properties+xml"
+PROPERTY_FMTID = "{D5CDD505-2E9C-101B-9397-08002B2CF9AE}"
+
+DOCUMENT_PART = "word/document.xml"
+DOCUMENT_RELS_PART = "word/_rels/document.xml.rels"
+CUSTOM_PROPS_PART = "docProps/custom.xml"
+PACKAGE_RELS_PART = "_rels/.rels"
+CONTENT_TYPES_PART = "[Content_Types].xml"
+
+# Parts rewritten on every commit. They are always kept at the end of the zip
+# so a commit only has to truncate and rewrite this small tail.
+MUTABLE_PARTS = (DOCUMENT_PART, DOCUMENT_RELS_PART, CUSTOM_PROPS_PART, PACKAGE_RELS_PART, CONTENT_TYPES_PART)
+
+# Summary cached in the custom properties on every commit, so a resume can
+# read the capture count without parsing the document body
+COUNT_PROPERTY = "ClickCaptureCount"
+MEDIA_BYTES_PROPERTY = "ClickMediaBytes"
+DOCUMENT_CRC_PROPERTY = "ClickDocumentCrc"
+SUMMARY_PROPERTIES = (COUNT_PROPERTY, MEDIA_BYTES_PROPERTY, DOCUMENT_CRC_PROPERTY)
+
+EMU_PER_INCH = 914400
+
+# Copy of the previous tail kept next to the document while a commit
+# overwrites it: offset, length and CRC-32 of the bytes that follow
+TAIL_SUFFIX = ".tail"
+TAIL_HEADER = struct.Struct("<QQI")
+
+IMAGE_CONTENT_TYPES = {
+    "jpeg": "image/jpeg",
+    "jpg": "image/jpeg",
+    "png": "image/png",
+}
+
+_INVALID_XML_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+# A body block: (xml fragment, text, holds a picture, rIds of the images it embeds)
+Block = Tuple[bytes, str, bool, Tuple[str, ...]]
+
+
+class BlockGroup(NamedTuple):
+    """
+    Body blocks staged together, such as one capture, and the media parts
+    they added. Returned by group_since() for remove_group()/restore_group().
+    """
+    blocks: Tuple[Block, ...]
+    media: Tuple[str, ...]
+
+
+class DocxWriter:
+    """
+    Append-only writer for a .docx package.
+
+    The package is laid out with media parts first and the small mutable
+    parts (document.xml, its rels and [Content_Types].xml) last. A commit
+    truncates the file at the mutable tail, appends only the media added
+    since the previous commit and rewrites the tail. Media already in the
+    package is never rewritten, so that part of a commit stays flat. The
+    tail still grows with the document: document.xml is deflated whole, the
+    central directory lists every entry, and both are backed up first, so
+    commit time grows linearly with the number of captures.
+
+    Before the tail is overwritten its old bytes are saved to a .tail file
+    beside the document. If a commit is cut short, the next open writes them
+    back, so the package is always either the old or the new version.
+
+    Opening a writer only checks the zip directory; the body is parsed on
+    first use, so it can be created on the GUI thread.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.size = 0
+        self.media_bytes = 0
+
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._picture_count = 0
+        self._head = b""
+        self._tail = b""
+        self._blocks: List[Block] = []
+        self._rels_head = b""
+        # Relationships added by this writer, by rId. One whose pictures have
+        # all been removed is detached, and reattached if they come back.
+        self._rels: Dict[str, bytes] = {}
+        self._detached_rels: Dict[str, bytes] = {}
+        self._rid_refs: Dict[str, int] = {}
+        self._content_types = b""
+        self._package_rels: Optional[bytes] = None
+        self._custom_props: List[bytes] = []
+        self._custom_props_raw: Optional[bytes] = None
+        self._summary_enabled = False
+        self._next_pid = 2
+        self._pending_media: List[Tuple[str, bytes]] = []
+        self._media_names = set()
+        self._media_index = {}
+        self._next_media = 1
+        self._next_rid = 1
+        self._next_docpr = 1
+        self._dirty = False
+        self._edits = 0
+        self._entries: List[zipfile.ZipInfo] = []
+        self._tail_entries: List[zipfile.ZipInfo] = []
+        self._tail_offset = 0
+        self._directory_size = 0
+        self._plan_cache = None
+        # A package saved by another app, reordered in memory until the first commit writes it
+        self._reordered: Optional[bytes] = None
+
+        restore_interrupted_commit(path)
+        with zipfile.ZipFile(path) as zf:
+            zf.getinfo(DOCUMENT_PART)
+        self.size = os.path.getsize(path)
+
+    @classmethod
+    def create(cls, path: str) -> "DocxWriter":
+        """Creates a new document at path from the python-docx default template."""
+        from docx import Document
+
+        buffer = io.BytesIO()
+        Document().save(buffer)
+        _write_normalized(buffer.getvalue(), path)
+        return cls(path)
+
+    # --- Loading ---
+
+    def _ensure_loaded(self):
+        with self._lock:
+            if not self._loaded:
+                self._load()
+                self._loaded = True
+
+    def _load(self):
+        infos = self._read_entries()
+        present = {i.filename for i in infos if i.filename in MUTABLE_PARTS}
+        tail_names = {i.filename for i in infos[len(infos) - len(present):]}
+        if tail_names != present:
+            # Word puts the mutable parts anywhere. The file is only rewritten by
+            # the first commit, so a document still open in Word fails there,
+            # where it is reported and retried, and nothing staged is lost
+            with open(self.path, "rb") as f:
+                data = f.read()
+            self._reordered = _normalized_package(data)
+            with zipfile.ZipFile(io.BytesIO(self._reordered)) as zf:
+                infos = sorted(zf.infolist(), key=lambda i: i.header_offset)
+
+        with zipfile.ZipFile(self.path) as zf:
+            names = zf.namelist()
+            document_xml = zf.read(DOCUMENT_PART)
+            rels_xml = zf.read(DOCUMENT_RELS_PART) if DOCUMENT_RELS_PART in names else None
+            self._content_types = zf.read(CONTENT_TYPES_PART)
+            self._package_rels = zf.read(PACKAGE_RELS_PART) if PACKAGE_RELS_PART in names else None
+            self._custom_props_raw = zf.read(CUSTOM_PROPS_PART) if CUSTOM_PROPS_PART in names else None
+
+        self._entries = [i for i in infos if i.filename not in MUTABLE_PARTS]
+        self._tail_entries = [i for i in infos if i.filename in MUTABLE_PARTS]
+        if self._tail_entries:
+            self._tail_offset = min(i.header_offset for i in self._tail_entries)
+        else:
+            self._tail_offset = self._read_directory_offset()
+        self._directory_size = sum(_central_size(i) for i in infos)
+
+        self._parse_document(document_xml)
+        self._parse_rels(rels_xml)
+        self._index_existing_media(rels_xml)
+        self._parse_custom_props()
+        self._ensure_summary_parts()
+        self._ensure_content_types()
+
+        for info in self._entries:
+            name = info.filename
+            if name.startswith("word/media/"):
+                self._media_names.add(name)
+                self.media_bytes += info.file_size
+                m = re.match(r"word/media/image(\d+)\.", name)
+                if m:
+                    self._next_media = max(self._next_media, int(m.group(1)) + 1)
+
+        self.size = len(self._reordered) if self._reordered is not None else os.path.getsize(self.path)
+
+    def _read_entries(self) -> List[zipfile.ZipInfo]:
+        with zipfile.ZipFile(self.path) as zf:
+            return sorted(zf.infolist(), key=lambda i: i.header_offset)
+
+    def _read_directory_offset(self) -> int:
+        with open(self.path, "rb") as f:
+            f.seek(-_EOCD_SIZE, os.SEEK_END)
+            return struct.unpack(zipfile.structEndArchive, f.read(_EOCD_SIZE))[6]
+
+    def _parse_document(self, document_xml: bytes):
+        root = etree.fromstring(document_xml)
+        body = root.find(f"{{{W_NS}}}body")
+
+        # Head: everything up to and including the opening body tag
+        match = re.search(rb"<(?:\w+:)?body\b[^>]*?(/?)>", document_xml)
+        if match.group(1):
+            head = document_xml[:match.start()] + document_xml[match.start():match.end() - 2] + b">"
+        else:
+            head = document_xml[:match.end()]
+        self._head = self._ensure_root_namespaces(head, root.nsmap)
+
+        sect_pr = None
+        for child in body:
+            if child.tag == f"{{{W_NS}}}sectPr":
+                sect_pr = child
+                continue
+            fragment = _strip_inherited_ns(etree.tostring(child), body.nsmap)
+            has_picture = _has_picture(child)
+            rids = tuple(str(rid) for rid in child.xpath(".//a:blip/@r:embed", namespaces=NSMAP))
+            self._blocks.append((fragment, _element_text(child), has_picture, rids))
+            for rid in rids:
+                self._rid_refs[rid] = self._rid_refs.get(rid, 0) + 1
+
+        sect_xml = b""
+        if sect_pr is not None:
+            sect_xml = _strip_inherited_ns(etree.tostring(sect_pr), body.nsmap)
+        self._tail = sect_xml + b"</w:body></w:document>"
+
+        self._picture_count = sum(1 for block in self._blocks if block[2])
+        for docpr_id in re.findall(rb"docPr\b[^>]*?\bid=\"(\d+)\"", document_xml):
+            self._next_docpr = max(self._next_docpr, int(docpr_id) + 1)
+
+    def _parse_rels(self, rels_xml: Optional[bytes]):
+        if rels_xml is None:
+            rels_xml = (b'<?xml version=\'1.0\' encoding=\'UTF-8\' standalone=\'yes\'?>\n'
+                        b'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                        b'</Relationships>')
+        if rels_xml.rstrip().endswith(b"/>") and b"</Relationships>" not in rels_xml:
+            rels_xml = rels_xml.rstrip()[:-2] + b"></Relationships>"
+        end = rels_xml.rindex(b"</Relationships>")
+        self._rels_head = rels_xml[:end]
+        for rid in re.findall(rb"Id=\"rId(\d+)\"", rels_xml):
+            self._next_rid = max(self._next_rid, int(rid) + 1)
+
+    def _index_existing_media(self, rels_xml: Optional[bytes]):
+        """
+        Indexes media already in the package by (size, CRC-32) straight from
+        the zip directory, so identical images can be found without reading them.
+        """
+        if not rels_xml:
+            return
+        infos = {i.filename: i for i in self._entries}
+        for attrs in re.findall(rb"<Relationship\b([^>]*?)/?>", rels_xml):
+            rel = dict(re.findall(rb'(\w+)="([^"]*)"', attrs))
+            if rel.get(b"Type", b"").decode() != IMAGE_REL or rel.get(b"TargetMode") == b"External":
+                continue
+            name = "word/" + rel.get(b"Target", b"").decode()
+            info = infos.get(os.path.normpath(name).replace(os.sep, "/"))
+            if info is not None:
+                key = (info.file_size, info.CRC)
+                self._media_index.setdefault(key, []).append((info.filename, rel[b"Id"].decode()))
+
+    def _parse_custom_props(self):
+        """Keeps custom properties set by other tools; the summary ones are regenerated."""
+        if not self._custom_props_raw:
+            return
+        try:
+            root = etree.fromstring(self._custom_props_raw)
+        except etree.XMLSyntaxError:
+            return
+        for prop in root:
+            if prop.get("name") in SUMMARY_PROPERTIES:
+                continue
+            try:
+                self._next_pid = max(self._next_pid, int(prop.get("pid", 0)) + 1)
+            except ValueError:
+                pass
+            self._custom_props.append(_strip_inherited_ns(etree.tostring(prop), root.nsmap))
+
+    def _ensure_summary_parts(self):
+        """Links docProps/custom.xml from the package rels if it is not already."""
+        if self._package_rels is None:
+            return
+        for attrs in re.findall(rb"<Relationship\b([^>]*?)/?>", self._package_rels):
+            rel = dict(re.findall(rb'(\w+)="([^"]*)"', attrs))
+            if rel.get(b"Type", b"").decode() == CUSTOM_PROPS_REL:
+                # Leave custom properties stored under another name alone
+                self._summary_enabled = rel.get(b"Target", b"").decode().lstrip("/") == CUSTOM_PROPS_PART
+                return
+        rids = [int(r) for r in re.findall(rb"Id=\"rId(\d+)\"", self._package_rels)]
+        rel = f'<Relationship Id="rId{max(rids, default=0) + 1}" Type="{CUSTOM_PROPS_REL}" Target="{CUSTOM_PROPS_PART}"/>'
+        end = self._package_rels.rindex(b"</Relationships>")
+        self._package_rels = self._package_rels[:end] + rel.encode() + self._package_rels[end:]
+        self._summary_enabled = True
+
+    def _ensure_root_namespaces(self, head: bytes, nsmap: dict) -> bytes:
+        """Declares the prefixes used by appended fragments on the root element if missing."""
+        required = {"w": W_NS, "r": R_NS, "wp": WP_NS}
+        missing = [(p, uri) for p, uri in required.items() if nsmap.get(p) != uri]
+        if not missing:
+            return head
+        decls = "".join(f' xmlns:{p}="{uri}"' for p, uri in missing).encode()
+        match = re.search(rb"<(?:\w+:)?document\b", head)
+        return head[:match.end()] + decls + head[match.end():]
+
+    def _ensure_content_types(self):
+        additions = []
+        for ext, content_type in IMAGE_CONTENT_TYPES.items():
+            if re.search(rf'Extension="{ext}"'.encode(), self._content_types, re.IGNORECASE):
+                continue
+            additions.append(f'<Default Extension="{ext}" ContentType="{content_type}"/>'.encode())
+        if self._summary_enabled and f'PartName="/{CUSTOM_PROPS_PART}"'.encode() not in self._content_types:
+            additions.append(f'<Override PartName="/{CUSTOM_PROPS_PART}" ContentType="{CUSTOM_PROPS_TYPE}"/>'.encode())
+        if additions:
+            end = self._content_types.rindex(b"</Types>")
+            self._content_types = self._content_types[:end] + b"".join(additions) + self._content_types[end:]
+
+    # --- Editing ---
+
+    @property
+    def picture_count(self) -> int:
+        self._ensure_loaded()
+        return self._picture_count
+
+    @property
+    def block_count(self) -> int:
+        self._ensure_loaded()
+        return len(self._blocks)
+
+    def block_text(self, index: int) -> str:
+        self._ensure_loaded()
+        return self._blocks[index][1]
+
+    def add_paragraph(self, text: str = "", index: Optional[int] = None):
+        """Appends a plain text paragraph, or inserts it at index."""
+        with self._lock:
+            self._ensure_loaded()
+            fragment = _paragraph_xml(text)
+            if index is None:
+                self._blocks.append((fragment, text, False, ()))
+            else:
+                self._blocks.insert(index, (fragment, text, False, ()))
+            self._dirty = True
+            self._edits += 1
+
+    def add_picture(self, data: bytes, ext: str, pixel_size: Tuple[int, int], width_emu: int):
+        """Appends a paragraph holding an inline picture scaled to width_emu; returns its media part."""
+        with self._lock:
+            self._ensure_loaded()
+            ext = ext.lower().lstrip(".")
+            key = (len(data), zlib.crc32(data))
+            media_name, rid = self._find_media(key, data)
+            if rid is None:
+                media_name = self._new_media_name(ext)
+                rid = f"rId{self._next_rid}"
+                self._next_rid += 1
+                self._pending_media.append((media_name, data))
+                self._media_names.add(media_name)
+                self.media_bytes += len(data)
+                self._media_index.setdefault(key, []).append((media_name, rid))
+                self._rels[rid] = \
+                    f'<Relationship Id="{rid}" Type="{IMAGE_REL}" Target="{media_name[len("word/"):]}"/>'.encode()
+            docpr_id = self._next_docpr
+            self._next_docpr += 1
+
+            px_w, px_h = pixel_size
+            height_emu = int(width_emu * px_h / px_w) if px_w else width_emu
+            block = (_picture_xml(rid, docpr_id, os.path.basename(media_name), width_emu, height_emu),
+                     "", True, (rid,))
+            self._blocks.append(block)
+            self._retain_block(block)
+            self._dirty = True
+            self._edits += 1
+            return media_name
+
+    def read_media(self, name: str) -> bytes:
+        """Bytes of a media part, whether staged or already committed."""
+        with self._lock:
+            for staged, data in self._pending_media:
+                if staged == name:
+                    return data
+            # Under the lock, so a commit is never writing the tail meanwhile
+            return read_media(self.path, name)
+
+    def pop_block(self) -> Optional[str]:
+        """Removes the last body block and returns its text."""
+        with self._lock:
+            self._ensure_loaded()
+            if not self._blocks:
+                return None
+            block = self._blocks.pop()
+            self._release_block(block)
+            self._dirty = True
+            self._edits += 1
+            return block[1]
+
+    def group_since(self, mark) -> BlockGroup:
+        """The blocks and media staged since mark() was taken."""
+        with self._lock:
+            blocks, _, media, _ = mark
+            return BlockGroup(tuple(self._blocks[blocks:]),
+                              tuple(name for name, _ in self._pending_media[media:]))
+
+    def remove_group(self, group: BlockGroup):
+        """
+        Takes a group's blocks out of the body. Relationships left without a
+        picture are dropped; media parts stay in the package so the group can
+        be restored without writing them again.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            count = len(group.blocks)
+            tail = self._blocks[len(self._blocks) - count:]
+            if count and all(a is b for a, b in zip(tail, group.blocks)) and len(tail) == count:
+                del self._blocks[-count:]
+            else:
+                # Something was appended after the group; find its blocks by identity
+                ids = {id(block) for block in group.blocks}
+                self._blocks = [block for block in self._blocks if id(block) not in ids]
+            for block in group.blocks:
+                self._release_block(block)
+            self._dirty = True
+            self._edits += 1
+
+    def restore_group(self, group: BlockGroup):
+        """Appends the blocks of a removed group again, with their relationships."""
+        with self._lock:
+            self._ensure_loaded()
+            self._blocks.extend(group.blocks)
+            for block in group.blocks:
+                self._retain_block(block)
+            self._dirty = True
+            self._edits += 1
+
+    def _retain_block(self, block: Block):
+        if block[2]:
+            self._picture_count += 1
+        for rid in block[3]:
+            self._rid_refs[rid] = self._rid_refs.get(rid, 0) + 1
+            if rid in self._detached_rels:
+                self._rels[rid] = self._detached_rels.pop(rid)
+
+    def _release_block(self, block: Block):
+        if block[2]:
+            self._picture_count -= 1
+        for rid in block[3]:
+            refs = self._rid_refs.get(rid, 0) - 1
+            if refs > 0:
+                self._rid_refs[rid] = refs
+                continue
+            self._rid_refs.pop(rid, None)
+            if rid in self._rels:
+                self._detached_rels[rid] = self._rels.pop(rid)
+
+    def _find_media(self, key, data: bytes):
+        """Returns (name, rId) of a media part with exactly these bytes, or (None, None)."""
+        candidates = self._media_index.get(key)
+        if not candidates:
+            return None, None
+        pending = dict(self._pending_media)
+        for name, rid in candidates:
+            if name in pending:
+                existing = pending[name]
+            else:
+                try:
+                    with zipfile.ZipFile(self.path) as zf:
+                        existing = zf.read(name)
+                except (OSError, KeyError, zipfile.BadZipFile):
+                    continue
+            if existing == data:
+                return name, rid
+        return None, None
+
+    def _new_media_name(self, ext: str) -> str:
+        while True:
+            name = f"word/media/image{self._next_media}.{ext}"
+            self._next_media += 1
+            if name not in self._media_names:
+                return name
+
+    # --- Persistence ---
+
+    def document_xml(self) -> bytes:
+        self._ensure_loaded()
+        return self._head + b"".join(b[0] for b in self._blocks) + self._tail
+
+    def rels_xml(self) -> bytes:
+        self._ensure_loaded()
+        return self._rels_head + b"".join(self._rels.values()) + b"</Relationships>"
+
+    def custom_props_xml(self, document_crc: int) -> bytes:
+        """Custom properties with the capture summary for a document.xml with this CRC-32."""
+        props = list(self._custom_props)
+        summary = ((COUNT_PROPERTY, "i4", self._picture_count),
+                   (MEDIA_BYTES_PROPERTY, "lpwstr", self.media_bytes),
+                   (DOCUMENT_CRC_PROPERTY, "lpwstr", document_crc))
+        for pid, (name, vt_type, value) in enumerate(summary, self._next_pid):
+            props.append(f'<property fmtid="{PROPERTY_FMTID}" pid="{pid}" name="{name}">'
+                         f'<vt:{vt_type}>{value}</vt:{vt_type}></property>'.encode())
+        return (b'<?xml version=\'1.0\' encoding=\'UTF-8\' standalone=\'yes\'?>\n'
+                + f'<Properties xmlns="{CUSTOM_PROPS_NS}" xmlns:vt="{VT_NS}">'.encode()
+                + b"".join(props) + b"</Properties>")
+
+    def size_upper_bound(self) -> int:
+        """
+        Cheap bound on the package size if committed now, without compressing
+        anything. Deflate never grows data by more than a few bytes per block.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            total = self._tail_offset + self._directory_size
+            for name, data in self._pending_media:
+                total += _entry_overhead(name) + len(data)
+            for name, data in self._mutable_parts():
+                total += _entry_overhead(name) + len(data) + len(data) // 16384 * 5 + 64
+            return total + _EOCD_SIZE
+
+    def projected_size(self) -> int:
+        """Exact package size in bytes if committed now."""
+        with self._lock:
+            self._ensure_loaded()
+            return self._plan()[2]
+
+    def mark(self):
+        """Checkpoint of the staged state, for rollback()."""
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._blocks), self._next_rid, len(self._pending_media), self._dirty
+
+    def rollback(self, mark):
+        """Drops everything staged since mark() was taken."""
+        with self._lock:
+            blocks, next_rid, media, dirty = mark
+            for name, data in self._pending_media[media:]:
+                self._media_names.discard(name)
+                self.media_bytes -= len(data)
+                entries = self._media_index.get((len(data), zlib.crc32(data)), [])
+                entries[:] = [e for e in entries if e[0] != name]
+            for block in self._blocks[blocks:]:
+                self._release_block(block)
+            del self._blocks[blocks:]
+            for rels in (self._rels, self._detached_rels):
+                for rid in [rid for rid in rels if int(rid[3:]) >= next_rid]:
+                    del rels[rid]
+            del self._pending_media[media:]
+            self._dirty = dirty
+            self._edits += 1
+
+    def commit(self, sync: bool = False):
+        """
+        Appends pending media and rewrites the mutable tail in place. With
+        sync, the data is flushed to disk before returning.
+        """
+        with self._lock:
+            if not self._loaded or (not self._dirty and not self._pending_media):
+                if sync and self._loaded:
+                    self.sync()
+                return
+            chunks, media_infos, total, tail_infos = self._plan()
+
+            if self._reordered is not None:
+                # First commit to a reordered package: the whole file is replaced at once
+                _write_package(self._reordered[:self._tail_offset] + b"".join(chunks), self.path)
+                self._reordered = None
+            else:
+                tail_path = self.path + TAIL_SUFFIX
+                with open(self.path, "r+b") as fp:
+                    fp.seek(self._tail_offset)
+                    old_tail = fp.read()
+                    _write_tail_backup(tail_path, self._tail_offset, old_tail, sync)
+
+                    fp.seek(self._tail_offset)
+                    for chunk in chunks:
+                        fp.write(chunk)
+                    fp.truncate()
+                    if sync:
+                        fp.flush()
+                        os.fsync(fp.fileno())
+                os.remove(tail_path)
+
+            self._entries.extend(media_infos)
+            if media_infos:
+                last = media_infos[-1]
+                self._tail_offset = last.header_offset + _entry_overhead(last.filename) + last.compress_size
+            self._tail_entries = tail_infos
+            self._directory_size = sum(_central_size(i) for i in self._entries + tail_infos)
+            self.size = total
+
+            self._pending_media = []
+            self._dirty = False
+            self._edits += 1
+
+    def sync(self):
+        """Flushes everything committed so far to disk."""
+        with self._lock:
+            with open(self.path, "r+b") as fp:
+                os.fsync(fp.fileno())
+
+    def _mutable_parts(self):
+        document = self.document_xml()
+        parts = [(DOCUMENT_PART, document), (DOCUMENT_RELS_PART, self.rels_xml())]
+        if self._summary_enabled:
+            parts.append((CUSTOM_PROPS_PART, self.custom_props_xml(zlib.crc32(document))))
+        elif self._custom_props_raw is not None:
+            parts.append((CUSTOM_PROPS_PART, self._custom_props_raw))
+        if self._package_rels is not None:
+            parts.append((PACKAGE_RELS_PART, self._package_rels))
+        parts.append((CONTENT_TYPES_PART, self._content_types))
+        return parts
+
+    def _plan(self):
+        """
+        Lays out the bytes a commit writes from the tail offset onwards:
+        new media entries, the mutable parts and the central directory.
+        """
+        key = self._edits
+        if self._plan_cache and self._plan_cache[0] == key:
+            return self._plan_cache[1]
+
+        chunks = []
+        offset = self._tail_offset
+        media_infos = []
+        for name, data in self._pending_media:
+            info = _stored_info(name, data, offset)
+            chunks += [info.FileHeader(), data]
+            offset += _entry_overhead(name) + len(data)
+            media_infos.append(info)
+
+        tail_infos = []
+        for name, data in self._mutable_parts():
+            compressed, info = _deflated_info(name, data, offset)
+            chunks += [info.FileHeader(), compressed]
+            offset += _entry_overhead(name) + len(compressed)
+            tail_infos.append(info)
+
+        directory = b"".join(_central_record(i) for i in self._entries + media_infos + tail_infos)
+        count = len(self._entries) + len(media_infos) + len(tail_infos)
+        chunks += [directory, struct.pack(zipfile.structEndArchive, zipfile.stringEndArchive,
+                                          0, 0, count, count, len(directory), offset, 0)]
+        total = offset + len(directory) + _EOCD_SIZE
+
+        plan = (chunks, media_infos, total, tail_infos)
+        self._plan_cache = (key, plan)
+        return plan
+
+
+_EOCD_SIZE = 22
+
+
+def _write_tail_backup(tail_path: str, offset: int, data: bytes, sync: bool):
+    with open(tail_path, "wb") as f:
+        f.write(TAIL_HEADER.pack(offset, len(data), zlib.crc32(data)) + data)
+        if sync:
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def restore_interrupted_commit(path: str) -> bool:
+    """
+    Puts back the tail saved by a commit that never finished. Returns True if
+    the document was restored. A backup that is itself incomplete means the
+    document was not touched yet, so it is only removed.
+    """
+    tail_path = path + TAIL_SUFFIX
+    if not os.path.exists(tail_path):
+        return False
+    with open(tail_path, "rb") as f:
+        backup = f.read()
+    restored = False
+    if len(backup) >= TAIL_HEADER.size:
+        offset, length, crc = TAIL_HEADER.unpack_from(backup)
+        data = backup[TAIL_HEADER.size:]
+        if len(data) == length and zlib.crc32(data) == crc:
+            with open(path, "r+b") as fp:
+                fp.seek(offset)
+                fp.write(data)
+                fp.truncate()
+                fp.flush()
+                os.fsync(fp.fileno())
+            restored = True
+    os.remove(tail_path)
+    return restored
+
+
+def read_summary(path: str) -> Optional[Tuple[int, int]]:
+    """
+    Capture count and media bytes cached in the custom properties, or None
+    when there is no summary or the document was edited after it was written.
+    Only the zip directory and the small custom.xml part are read.
+    """
+    try:
+        with zipfile.ZipFile(path) as zf:
+            document_crc = zf.getinfo(DOCUMENT_PART).CRC
+            root = etree.fromstring(zf.read(CUSTOM_PROPS_PART))
+    except (OSError, KeyError, zipfile.BadZipFile, etree.XMLSyntaxError):
+        return None
+    values = {}
+    for prop in root:
+        if prop.get("name") in SUMMARY_PROPERTIES and len(prop):
+            values[prop.get("name")] = (prop[0].text or "").strip()
+    try:
+        if int(values[DOCUMENT_CRC_PROPERTY]) != document_crc:
+            return None
+        return int(values[COUNT_PROPERTY]), int(values[MEDIA_BYTES_PROPERTY])
+    except (KeyError, ValueError):
+        return None
+
+
+def read_media(path: str, name: str) -> bytes:
+    with zipfile.ZipFile(path) as zf:
+        return zf.read(name)
+
+
+def count_pictures(path: str) -> int:
+    """
+    Counts body paragraphs holding an inline picture, as the cached count
+    does, by streaming word/document.xml without keeping the tree.
+    """
+    body_tag = f"{{{W_NS}}}body"
+    count = 0
+    with zipfile.ZipFile(path) as zf, zf.open(DOCUMENT_PART) as f:
+        for _, element in etree.iterparse(f, events=("end",)):
+            parent = element.getparent()
+            if parent is not None and parent.tag == body_tag:
+                if _has_picture(element):
+                    count += 1
+                # Finished body block: free it and everything before it
+                element.clear()
+                while element.getprevious() is not None:
+                    del parent[0]
+    return count
+
+
+def capture_count(path: str) -> int:
+    """Number of pictures in a document, from the cached summary when it is valid."""
+    summary = read_summary(path)
+    if summary is not None:
+        return summary[0]
+    return count_pictures(path)
+
+
+def compact(path: str, dry_run: bool = False) -> int:
+    """
+    Removes image relationships that no element of the body points at, and
+    media parts that no relationship targets, such as pictures undone in this
+    app or deleted in Word. Returns the bytes reclaimed, or the bytes that
+    would be with dry_run. The document body is left as it is.
+    """
+    restore_interrupted_commit(path)
+    with open(path, "rb") as f:
+        data = f.read()
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        infos = zf.infolist()
+        document_xml = zf.read(DOCUMENT_PART)
+        rels_parts = {i.filename: zf.read(i.filename) for i in infos if i.filename.endswith(".rels")}
+        content_types = zf.read(CONTENT_TYPES_PART)
+        custom_props = zf.read(CUSTOM_PROPS_PART) if CUSTOM_PROPS_PART in zf.namelist() else None
+
+    replace = {}
+    if DOCUMENT_RELS_PART in rels_parts:
+        used = _referenced_ids(document_xml)
+        root = etree.fromstring(rels_parts[DOCUMENT_RELS_PART])
+        unused = [rel for rel in root if rel.get("Type") == IMAGE_REL
+                  and rel.get("TargetMode") != "External" and rel.get("Id") not in used]
+        if unused:
+            for rel in unused:
+                root.remove(rel)
+            rels_parts[DOCUMENT_RELS_PART] = replace[DOCUMENT_RELS_PART] = etree.tostring(
+                root, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+    targets = set()
+    for part, rels_xml in rels_parts.items():
+        source_dir = posixpath.dirname(posixpath.dirname(part))
+        for rel in etree.fromstring(rels_xml):
+            target = rel.get("Target", "")
+            if rel.get("TargetMode") == "External" or not target:
+                continue
+            if target.startswith("/"):
+                targets.add(target.lstrip("/"))
+            else:
+                targets.add(posixpath.normpath(posixpath.join(source_dir, target)))
+    skip = {i.filename for i in infos if i.filename.startswith("word/media/") and i.filename not in targets}
+
+    if not replace and not skip:
+        return 0
+    if dry_run:
+        return sum(_entry_overhead(i.filename) + _central_size(i) + i.compress_size
+                   for i in infos if i.filename in skip)
+
+    for name in skip:
+        content_types = re.sub(rf'<Override PartName="/{re.escape(name)}"[^>]*/>'.encode(), b"", content_types)
+    replace[CONTENT_TYPES_PART] = content_types
+    if custom_props is not None:
+        media_bytes = sum(i.file_size for i in infos if i.filename.startswith("word/media/") and i.filename not in skip)
+        replace[CUSTOM_PROPS_PART] = _with_media_bytes(custom_props, media_bytes)
+    _write_normalized(data, path, replace, skip)
+    return len(data) - os.path.getsize(path)
+
+
+def _referenced_ids(part_xml: bytes) -> set:
+    """Relationship ids used by any r:* attribute (or legacy VML o:relid) in a part."""
+    prefix = f"{{{R_NS}}}"
+    used = set()
+    for _, element in etree.iterparse(io.BytesIO(part_xml), events=("start",)):
+        for name, value in element.attrib.items():
+            if name.startswith(prefix) or name.endswith("}relid"):
+                used.add(value)
+    return used
+
+
+def _with_media_bytes(custom_props: bytes, media_bytes: int) -> bytes:
+    """Custom properties with the cached media size updated; other values are untouched."""
+    try:
+        root = etree.fromstring(custom_props)
+    except etree.XMLSyntaxError:
+        return custom_props
+    for prop in root:
+        if prop.get("name") == MEDIA_BYTES_PROPERTY and len(prop):
+            prop[0].text = str(media_bytes)
+            return etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+    return custom_props
+
+
+def _entry_overhead(name: str) -> int:
+    """Size of the local file header for name."""
+    return 30 + len(name.encode("utf-8"))
+
+
+def _central_size(info: zipfile.ZipInfo) -> int:
+    return 46 + len(info.filename.encode("utf-8")) + len(info.extra) + len(info.comment)
+
+
+def _zip_info(name: str, offset: int = 0) -> zipfile.ZipInfo:
+    info = zipfile.ZipInfo(name, date_time=(1980, 1, 1, 0, 0, 0))
+    info.external_attr = 0o600 << 16
+    info.header_offset = offset
+    return info
+
+
+def _stored_info(name: str, data: bytes, offset: int) -> zipfile.ZipInfo:
+    # Images are already compressed, so they are stored as-is
+    info = _zip_info(name, offset)
+    info.compress_type = zipfile.ZIP_STORED
+    info.CRC = zlib.crc32(data)
+    info.compress_size = info.file_size = len(data)
+    return info
+
+
+def _deflated_info(name: str, data: bytes, offset: int):
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+    info = _zip_info(name, offset)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.CRC = zlib.crc32(data)
+    info.file_size = len(data)
+    info.compress_size = len(compressed)
+    return compressed, info
+
+
+def _central_record(info: zipfile.ZipInfo) -> bytes:
+    dt = info.date_time
+    dosdate = (dt[0] - 1980) << 9 | dt[1] << 5 | dt[2]
+    dostime = dt[3] << 11 | dt[4] << 5 | (dt[5] // 2)
+    try:
+        filename, flag_bits = info.filename.encode("ascii"), info.flag_bits
+    except UnicodeEncodeError:
+        filename, flag_bits = info.filename.encode("utf-8"), info.flag_bits | 0x800
+    record = struct.pack(zipfile.structCentralDir, zipfile.stringCentralDir,
+                         info.create_version, info.create_system, info.extract_version, info.reserved,
+                         flag_bits, info.compress_type, dostime, dosdate, info.CRC,
+                         info.compress_size, info.file_size, len(filename), len(info.extra),
+                         len(info.comment), 0, info.internal_attr, info.external_attr, info.header_offset)
+    return record + filename + info.extra + info.comment
+
+
+def _write_normalized(data: bytes, path: str, replace: Optional[Dict[str, bytes]] = None, skip=()):
+    """
+    Rewrites a package with the mutable parts moved to the end of the zip,
+    optionally replacing the content of some parts and leaving others out.
+    """
+    _write_package(_normalized_package(data, replace, skip), path)
+
+
+def _normalized_package(data: bytes, replace: Optional[Dict[str, bytes]] = None, skip=()) -> bytes:
+    replace = replace or {}
+    output = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(data)) as src, zipfile.ZipFile(output, "w") as dst:
+        infos = [i for i in src.infolist() if i.filename not in skip]
+        ordered = [i for i in infos if i.filename not in MUTABLE_PARTS]
+        ordered += [i for n in MUTABLE_PARTS[::-1] for i in infos if i.filename == n]
+        for info in ordered:
+            content = replace.get(info.filename)
+            if content is None:
+                content = src.read(info.filename)
+            dst.writestr(info, content, compress_type=info.compress_type)
+    return output.getvalue()
+
+
+def _write_package(data: bytes, path: str):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        # Whole-package rewrites are rare, so they are always flushed before the swap
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        os.remove(tmp_path)
+        raise
+
+
+def _strip_inherited_ns(fragment: bytes, nsmap: dict) -> bytes:
+    """Drops namespace declarations that lxml copies from the root onto a serialized child."""
+    end = fragment.index(b">")
+    start_tag = fragment[:end]
+    for prefix, uri in nsmap.items():
+        if prefix is None:
+            continue
+        start_tag = start_tag.replace(f' xmlns:{prefix}="{uri}"'.encode(), b"")
+    return start_tag + fragment[end:]
+
+
+def _has_picture(element) -> bool:
+    """A body block counts as a capture when one of its own runs holds an inline picture."""
+    return bool(element.xpath("./w:r/w:drawing/wp:inline", namespaces=NSMAP))
+
+
+def _element_text(element) -> str:
+    return "".join(element.itertext(f"{{{W_NS}}}t"))
+
+
+def _clean_text(text: str) -> str:
+    return _INVALID_XML_CHARS.sub("", str(text))
+
+
+def _paragraph_xml(text: str) -> bytes:
+    if not text:
+        return b"<w:p/>"
+    parts = []
+    for i, line in enumerate(_clean_text(text).split("\n")):
+        if i:
+            parts.append("<w:br/>")
+        for j, chunk in enumerate(line.split("\t")):
+            if j:
+                parts.append("<w:tab/>")
+            if chunk:
+                parts.append(f'<w:t xml:space="preserve">{escape(chunk)}</w:t>')
+    return f"<w:p><w:r>{''.join(parts)}</w:r></w:p>".encode("utf-8")
+
+
+def _picture_xml(rid: str, docpr_id: int, name: str, cx: int, cy: int) -> bytes:
+    return (
+        f'<w:p><w:r><w:drawing>'
+        f'<wp:inline distT="0" distB="0" distL="0" distR="0" xmlns:a="{A_NS}" xmlns:pic="{PIC_NS}">'
+        f'<wp:extent cx="{cx}" cy="{cy}"/>'
+        f'<wp:docPr id="{docpr_id}" name="Picture {docpr_id}"/>'
+        f'<wp:cNvGraphicFramePr><a:graphicFrameLocks noChangeAspect="1"/></wp:cNvGraphicFramePr>'
+        f'<a:graphic><a:graphicData uri="{PIC_NS}"><pic:pic>'
+        f'<pic:nvPicPr><pic:cNvPr id="0" name="{escape(name)}"/><pic:cNvPicPr/></pic:nvPicPr>'
+        f'<pic:blipFill><a:blip r:embed="{rid}"/><a:stretch><a:fillRect/></a:stretch></pic:blipFill>'
+        f'<pic:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{cx}" cy="{cy}"/></a:xfrm>'
+        f'<a:prstGeom prst="rect"/></pic:spPr>'
+        f'</pic:pic></a:graphicData></a:graphic></wp:inline></w:drawing></w:r></w:p>'
+    ).encode("utf-8")
@@ -0,0 +1,340 @@
+import io
+import os
+import struct
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import NamedTuple, Optional, Tuple
+
+from PIL import Image
+
+JPEG_OPTIONS = {"quality": 90, "subsampling": 0}
+WEBP_OPTIONS = {"quality": 90, "method": 4}
+
+# Rough encode time of each format relative to JPEG on the same frame, used
+# to tell whether a format still fits in what is left of the budget
+FORMAT_COST = {"jpeg": 1.0, "png": 4.0, "webp": 12.0}
+
+# File extension for each output format
+FORMAT_EXTENSIONS = {"jpeg": "jpg", "png": "png", "webp": "webp"}
+
+# A frame whose downsampled copy has at most this many colours is treated as
+# flat UI/text, which usually comes out smallest as a palette PNG
+FLAT_SAMPLE_COLORS = 512
+SAMPLE_WIDTH = 256
+
+# BITMAPINFOHEADER: size, width, height, planes, bit count, compression,
+# image size, horizontal and vertical pixels per metre, colours used, important
+DIB_HEADER = struct.Struct("<IiiHHIIiiII")
+DIB_CHUNK = 1 << 20
+
+# Modes with one byte per band, handed to encoder processes as raw pixels
+SHARED_MODES = ("L", "RGB", "RGBA")
+
+
+class EncodeSettings(NamedTuple):
+    """How a capture is encoded. Several formats means pick the smallest."""
+    formats: Tuple[str, ...] = ("jpeg",)
+    budget_s: float = 0.05
+    max_width: Optional[int] = None
+
+
+def fit_width(image: Image.Image, max_width: Optional[int]) -> Image.Image:
+    """Downscales image to at most max_width pixels wide, keeping its aspect ratio."""
+    if not max_width or image.width <= max_width:
+        return image
+    height = max(1, round(image.height * max_width / image.width))
+    # reducing_gap shrinks by whole factors first, then finishes with Lanczos
+    return image.resize((max_width, height), Image.LANCZOS, reducing_gap=2.0)
+
+
+def encode_image(image: Image.Image, fmt: str) -> bytes:
+    output = io.BytesIO()
+    rgb = image.convert("RGB")
+    if fmt == "png":
+        palette = rgb.quantize(256, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE)
+        palette.save(output, "PNG")
+    elif fmt == "webp":
+        rgb.save(output, "WEBP", **WEBP_OPTIONS)
+    else:
+        rgb.save(output, "JPEG", **JPEG_OPTIONS)
+    return output.getvalue()
+
+
+def encode_jpeg(image: Image.Image, max_width: Optional[int] = None) -> bytes:
+    return encode_image(fit_width(image, max_width), "jpeg")
+
+
+def is_flat(image: Image.Image) -> bool:
+    """Cheap content check: counts colours on a nearest-neighbour thumbnail."""
+    height = max(1, round(image.height * SAMPLE_WIDTH / max(1, image.width)))
+    sample = image.resize((min(image.width, SAMPLE_WIDTH), min(image.height, height)), Image.NEAREST)
+    return sample.convert("RGB").getcolors(FLAT_SAMPLE_COLORS) is not None
+
+
+def encode_frame(image: Image.Image, settings: EncodeSettings) -> Tuple[bytes, str]:
+    """
+    Encodes image in the smallest of settings.formats, as (bytes, format).
+    Formats are tried in the order that suits the content. The first always
+    runs; a later one is skipped when its expected time, scaled by
+    FORMAT_COST from the encodes already done, exceeds what is left of
+    settings.budget_s.
+    """
+    image = fit_width(image, settings.max_width)
+    formats = list(settings.formats)
+    if len(formats) == 1:
+        return encode_image(image, formats[0]), formats[0]
+
+    if is_flat(image):
+        preferred = ("png", "webp", "jpeg")
+    else:
+        # A 256-colour palette would visibly band photographic content
+        preferred = ("jpeg", "webp")
+        formats = [f for f in formats if f != "png"] or ["jpeg"]
+    formats.sort(key=lambda f: preferred.index(f) if f in preferred else len(preferred))
+    started = time.perf_counter()
+    best = None
+    # Slowest seconds per unit of FORMAT_COST seen so far on this frame
+    unit_seconds = 0.0
+    for fmt in formats:
+        cost = FORMAT_COST.get(fmt, 1.0)
+        if best and unit_seconds * cost > settings.budget_s - (time.perf_counter() - started):
+            continue
+        encode_started = time.perf_counter()
+        data = encode_image(image, fmt)
+        unit_seconds = max(unit_seconds, (time.perf_counter() - encode_started) / cost)
+        if best is None or len(data) < len(best[0]):
+            best = (data, fmt)
+    return best
+
+
+def encode_dib(image: Image.Image) -> bytearray:
+    """
+    CF_DIB payload for a frame: a BITMAPINFOHEADER followed by 24-bit BGR rows
+    bottom-up, each padded to 4 bytes. Pillow's raw packer does the channel
+    swap, row flip and padding in one pass, writing straight into a single
+    preallocated buffer; no BMP file is written and sliced.
+    """
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.load()
+    width, height = image.size
+    stride = (width * 3 + 3) & ~3
+    size = stride * height
+    ppm = int(image.info.get("dpi", (96, 96))[0] * 39.3701 + 0.5)
+
+    buffer = bytearray(DIB_HEADER.size + size)
+    DIB_HEADER.pack_into(buffer, 0, DIB_HEADER.size, width, height, 1, 24, 0, size, ppm, ppm, 0, 0)
+    pack_into(image, ("BGR", stride, -1), memoryview(buffer)[DIB_HEADER.size:], max(DIB_CHUNK, stride))
+    return buffer
+
+
+def pack_into(image: Image.Image, rawmode, view: memoryview, chunk: int = DIB_CHUNK):
+    """
+    Writes image's pixels into view with Pillow's raw packer, the encoder
+    tobytes() uses, drained chunk by chunk instead of being joined into
+    another full-size copy.
+    """
+    encoder = Image._getencoder(image.mode, "raw", rawmode)
+    encoder.setimage(image.im, (0, 0) + image.size)
+    offset = 0
+    while offset < len(view):
+        _, status, data = encoder.encode(chunk)
+        view[offset:offset + len(data)] = data
+        offset += len(data)
+        if status < 0:
+            raise RuntimeError(f"encoder error {status} packing {image.mode} pixels")
+        if status:
+            break
+
+
+def _encode_shared(shm_name: str, mode: str, size, settings: EncodeSettings) -> Tuple[bytes, str]:
+    """Worker-process entry: encodes raw pixels published in shared memory."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        image = Image.frombuffer(mode, size, shm.buf, "raw", mode, 0, 1)
+        result = encode_frame(image, settings)
+        del image
+        return result
+    finally:
+        shm.close()
+
+
+def _encode_bytes(data: bytes, settings: EncodeSettings) -> Tuple[bytes, str]:
+    with Image.open(io.BytesIO(data)) as img:
+        return encode_frame(img, settings)
+
+
+def _encode_file(path: str, settings: EncodeSettings) -> Tuple[bytes, str]:
+    with Image.open(path) as img:
+        return encode_frame(img, settings)
+
+
+class EncoderPool:
+    """
+    Encodes frames on a pool of worker processes, one per core.
+    Raw pixels are handed over through shared memory rather than pickled.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def submit(self, frame, settings: EncodeSettings) -> Future:
+        """Starts encoding a PendingFrame; the future resolves to (bytes, format)."""
+        if frame.image is not None:
+            image = frame.image
+            image.load()
+            if image.mode not in SHARED_MODES:
+                image = image.convert("RGB")
+            # Pixels are packed straight into the shared block, with no full-size copy on this thread
+            size = image.width * image.height * len(image.getbands())
+            shm = shared_memory.SharedMemory(create=True, size=max(1, size))
+            try:
+                pack_into(image, image.mode, shm.buf[:size])
+            except Exception:
+                shm.close()
+                shm.unlink()
+                raise
+            future = self._executor.submit(_encode_shared, shm.name, image.mode, image.size, settings)
+
+            def _free(_):
+                shm.close()
+                shm.unlink()
+
+            future.add_done_callback(_free)
+            return future
+        if frame.data is not None:
+            return self._executor.submit(_encode_bytes, frame.data, settings)
+        return self._executor.submit(_encode_file, frame.path, settings)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class _Artifact:
+    __slots__ = ("frame", "settings", "future", "consumers", "started", "written_paths", "file_lock",
+                 "encode_seconds")
+
+    def __init__(self, frame, consumers: int, settings: EncodeSettings):
+        self.frame = frame
+        self.settings = settings
+        self.future: Future = Future()
+        self.consumers = consumers
+        self.started = False
+        self.written_paths = set()
+        self.file_lock = threading.Lock()
+        self.encode_seconds: Optional[float] = None
+
+
+class ArtifactCache:
+    """
+    Encoded bytes for each capture, shared by the save and clipboard paths.
+    The first consumer to ask triggers the encode; the others wait on the
+    same future. An entry is evicted once every consumer has released it.
+    """
+
+    def __init__(self, encoder_pool: Optional[EncoderPool] = None):
+        self.encoder_pool = encoder_pool
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def register(self, capture_id: int, frame, consumers: int, settings: Optional[EncodeSettings] = None):
+        """settings may downscale the encoded image; the frame itself stays full size."""
+        entry = _Artifact(frame, consumers, settings or EncodeSettings())
+        with self._lock:
+            self._entries[capture_id] = entry
+        if self.encoder_pool:
+            # Start right away so the encode overlaps with queue wait
+            submitted = time.perf_counter()
+            try:
+                pooled = self.encoder_pool.submit(frame, entry.settings)
+            except Exception:
+                return
+            entry.started = True
+
+            def _done(f):
+                entry.encode_seconds = time.perf_counter() - submitted
+                _chain(f, entry.future)
+
+            pooled.add_done_callback(_done)
+
+    def get(self, capture_id: int) -> Tuple[bytes, str]:
+        """The capture's encoded bytes and their format."""
+        with self._lock:
+            entry = self._entries[capture_id]
+            owner = not entry.started
+            entry.started = True
+        if owner:
+            try:
+                started = time.perf_counter()
+                result = encode_frame(entry.frame.load(), entry.settings)
+                entry.encode_seconds = time.perf_counter() - started
+                entry.future.set_result(result)
+            except Exception as e:
+                entry.future.set_exception(e)
+        try:
+            return entry.future.result()
+        except Exception:
+            if owner:
+                raise
+            # The worker process failed; fall back to encoding on this thread
+            return encode_frame(entry.frame.load(), entry.settings)
+
+    def encode_seconds(self, capture_id: int) -> Optional[float]:
+        """How long the encode took, once it has finished."""
+        with self._lock:
+            entry = self._entries.get(capture_id)
+        return entry.encode_seconds if entry else None
+
+    def write_file(self, capture_id: int, path: str) -> Tuple[bytes, str]:
+        """Writes the encoded bytes to path, at most once per entry."""
+        data, fmt = self.get(capture_id)
+        with self._lock:
+            entry = self._entries[capture_id]
+        with entry.file_lock:
+            if path not in entry.written_paths:
+                with open(path, "wb") as f:
+                    f.write(data)
+                entry.written_paths.add(path)
+        return data, fmt
+
+    def release(self, capture_id: int):
+        with self._lock:
+            entry = self._entries.get(capture_id)
+            if entry is None:
+                return
+            entry.consumers -= 1
+            if entry.consumers <= 0:
+                del self._entries[capture_id]
+
+
+def _chain(source: Future, target: Future):
+    if source.cancelled():
+        target.set_exception(RuntimeError("Encoding was cancelled"))
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+_pool: Optional[EncoderPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_encoder_pool() -> EncoderPool:
+    """Returns the process-wide encoder pool, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = EncoderPool()
+        return _pool
+
+
+def shutdown_encoder_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
@@ -1,3 +1,4 @@
+import io
 import os
 import threading
 import ctypes
@@ -5,20 +6,144 @@ import tempfile
 import shutil
 import queue
 import time
-import io
 import re
 import uuid
 import zipfile
-from typing import Optional, List, Dict
+from typing import Callable, Optional, List, Dict
 
-from PIL import Image, ImageGrab
-from docx import Document
+from PIL import Image, features
 from docx.shared import Inches
-import win32clipboard
-import win32con
 
+try:
+    import win32clipboard
+    import win32con
+except ImportError:
+    # Off Windows the session only runs with injected backends (see benchmarks/)
+    win32clipboard = None
+    win32con = None
+
+from src.capture import CaptureBackend, create_backend, parse_rect
+from src.clipboard import FileDropList
+from src.dedupe import frame_hash, hash_distance
+from src.docx_writer import BlockGroup, DocxWriter, capture_count, compact, read_media
+from src.encoding import (FORMAT_EXTENSIONS, ArtifactCache, EncoderPool, EncodeSettings, encode_dib,
+                          get_encoder_pool)
+from src.frames import FrameBudget, PendingFrame
+from src.journal import JOURNAL_SUFFIX, RECOVERING_SUFFIX, CaptureJournal, default_journal_dir, read_journal
+from src.metrics import CaptureTiming, SessionMetrics
+from src.workers import SessionQueue
 from src.hotkeys import kernel32, user32
 
+# Width of a picture in the DOCX body
+EMBED_WIDTH_INCHES = 6
+
+# Waits between attempts to open a clipboard another app is holding (about 0.6 s in all)
+CLIPBOARD_RETRY_DELAYS = (0.005, 0.01, 0.02, 0.04, 0.08, 0.16, 0.32)
+
+# Longest a burst of captures is held back to share one commit, and the
+# quiet gap after which a burst counts as over
+DEFAULT_GROUP_COMMIT_MS = 250
+GROUP_COMMIT_GAP = 0.05
+
+# Tasks on the save queue that end a group-commit batch and run on their own
+CONTROL_TASKS = ("UNDO", "REDO", "ROTATE")
+
+
+def stage_capture(writer: DocxWriter, caption, image_data, image_format, pixel_size):
+    """Stages the blocks of one capture: optional caption, picture and separator. Returns the media part."""
+    if caption:
+        writer.add_paragraph(caption)
+    media_name = writer.add_picture(image_data, image_format, pixel_size, Inches(EMBED_WIDTH_INCHES))
+    writer.add_paragraph("-" * 50)
+    return media_name
+
+
+def recover_journal(path: str):
+    """
+    Replays a journal left by a session that did not close cleanly into its
+    document. Returns (document, captures recovered); the journal is removed
+    once the document is committed. If the replay fails, the journal is
+    put back under its own name for the next start to try again.
+    """
+    if path.endswith(RECOVERING_SUFFIX):
+        # Left by a recovery that did not finish
+        recovering = path
+        path = path[:-len(RECOVERING_SUFFIX)] + JOURNAL_SUFFIX
+    else:
+        # A journal still open by a running session cannot be renamed on Windows
+        recovering = path[:-len(JOURNAL_SUFFIX)] + RECOVERING_SUFFIX
+        os.replace(path, recovering)
+    try:
+        return _replay_journal(recovering)
+    except Exception:
+        os.replace(recovering, path)
+        raise
+
+
+def _replay_journal(recovering: str):
+    document, records = read_journal(recovering)
+    if not document or not records:
+        # Nothing was pending; the document is left exactly as it is, even if it is gone
+        os.remove(recovering)
+        return document, 0
+
+    if os.path.exists(document):
+        writer = DocxWriter(document)
+    else:
+        os.makedirs(os.path.dirname(document) or ".", exist_ok=True)
+        writer = DocxWriter.create(document)
+
+    applied: List[BlockGroup] = []
+    undone: List[BlockGroup] = []
+    for meta, data in records:
+        kind = meta.get("k")
+        mark = writer.mark()
+        if kind == "capture":
+            stage_capture(writer, meta.get("caption"), data, meta.get("format", "jpeg"), tuple(meta["size"]))
+        elif kind == "duplicate":
+            for line in meta.get("lines", []):
+                writer.add_paragraph(line)
+        elif kind == "undo":
+            # Undo of a capture committed before the crash is already in the document
+            if applied:
+                group = applied.pop()
+                writer.remove_group(group)
+                undone.append(group)
+            continue
+        elif kind == "redo":
+            if undone:
+                group = undone.pop()
+                writer.restore_group(group)
+                applied.append(group)
+            continue
+        else:
+            continue
+        applied.append(writer.group_since(mark))
+        undone = []
+
+    writer.commit()
+    os.remove(recovering)
+    return document, len(applied)
+
+
+class CaptureRecord:
+    """
+    Everything one capture added, so it can be undone and redone exactly:
+    the DOCX blocks, the image file and the file in the session folder.
+    """
+
+    __slots__ = ("count", "group", "image_path", "folder_path", "duplicate", "stashed_path")
+
+    def __init__(self, count: int, group: Optional[BlockGroup] = None, image_path: Optional[str] = None,
+                 folder_path: Optional[str] = None, duplicate: bool = False):
+        self.count = count
+        self.group = group
+        self.image_path = image_path
+        self.folder_path = folder_path
+        self.duplicate = duplicate
+        # Where the image file waits while the capture is undone
+        self.stashed_path: Optional[str] = None
+
 
 class ScreenshotSession:
     """
@@ -26,29 +151,88 @@ class ScreenshotSession:
     Handles capturing images, saving to Word/Folder, and clipboard operations.
     """
 
-    def __init__(self, config: Dict, gui_callback_queue: queue.Queue):
+    def __init__(self, config: Dict, gui_callback_queue: queue.Queue,
+                 capture_backend: Optional[CaptureBackend] = None,
+                 clipboard=None,
+                 window_title: Optional[Callable[[], str]] = None):
         self.config = config
         self.gui_queue = gui_callback_queue
 
+        # Platform backends; the defaults talk to the real screen and clipboard
+        self.capture_backend = capture_backend or create_backend(str(config.get('capture_backend', 'pil')).lower())
+        self.capture_mode = str(config.get('capture_mode', 'all_screens')).lower()
+        self.capture_region = parse_rect(config.get('capture_region', ''))
+        self.clipboard = clipboard or win32clipboard
+        self.read_window_title = window_title or self._get_active_window_title
+
         self.base_filename = ""
         self.current_filepath = ""
         self.screenshot_count = 0
         self.max_size_bytes = 0
         self.captured_images = []
+        # DOCX captures have no file until the clipboard needs one; path -> (document, media part)
+        self.unwritten_files: Dict[str, tuple] = {}
+        self.unwritten_lock = threading.Lock()
+        # Files published to the clipboard by auto-copy, newest last
+        self.clipboard_files = FileDropList()
         self.temp_dir = None
-        self.document = None
+        self.frame_budget: Optional[FrameBudget] = None
+        self.embed_max_width: Optional[int] = None
+        self.encode_settings = EncodeSettings()
+        self.encoder_pool: Optional[EncoderPool] = None
+        self.writer: Optional[DocxWriter] = None
+        # Write-ahead log of captures staged but not yet committed (DOCX mode)
+        self.journal: Optional[CaptureJournal] = None
+        self.commit_lock = threading.RLock()
+        # Newest event (capture_seq) staged in the writer; a commit makes everything up to it durable
+        self.journal_seq = 0
+        self.event_lock = threading.Lock()
         self.is_running = True
         self.status = "Active"
 
-        self.save_queue = queue.Queue()
-        self.clipboard_queue = queue.Queue()
-        self.save_lock = threading.Lock()
+        # Run in order on the threads shared by all sessions; see src/workers.py
+        self.save_queue = SessionQueue(self._handle_save_task)
+        self.clipboard_queue = SessionQueue(self._handle_clipboard_item)
+        # Journals each event as soon as it happens, in order, ahead of the save queue
+        self.journal_queue = SessionQueue(self._handle_journal_event)
+        self.artifacts: Optional[ArtifactCache] = None
+        self.capture_seq = 0
 
-        self.save_thread = None
-        self.clipboard_thread = None
+        # Per-stage latency of each capture, keyed by capture id until recorded
+        self.metrics: Optional[SessionMetrics] = None
+        self.timings: Dict[int, CaptureTiming] = {}
+        self.staged_captures: List[int] = []
+
+        self.finish_thread = None
 
         self.warning_shown = False
         self.last_size_str = "0 KB"
+        self.group_commit = True
+        self.group_commit_delay = DEFAULT_GROUP_COMMIT_MS / 1000
+
+        # Near-duplicate detection against the last stored frame
+        self.dedupe_mode = "off"
+        self.dedupe_threshold = 0
+        self.last_frame_hash = None
+        self.last_frame_count = 0
+        self.duplicate_counts = set()
+
+        # Captures of the current part in order, and the ones undone since the last capture
+        self.undo_stack: List[CaptureRecord] = []
+        self.redo_stack: List[CaptureRecord] = []
+        self.undo_levels = 100
+        self.compact_docx = True
+        # When commits are flushed to disk: "none", "rotation" (and close) or "commit"
+        self.fsync_policy = "rotation"
+
+        # Running size of the session folder (folder mode), so captures never walk the directory
+        self.folder_bytes = 0
+        self.folder_files: Dict[str, int] = {}
+        self.folder_lock = threading.Lock()
+        self.folder_reconcile_interval = 60.0
+        self.folder_reconciled_at = 0.0
+        self.folder_reconciling = False
+        self.folder_touched = set()
         self.resume_mode = False
         self.created_docs = set()
         self.initial_doc_set = set()
@@ -80,6 +264,11 @@ class ScreenshotSession:
             self.base_filename = os.path.basename(self.current_filepath)
             if not os.path.exists(self.current_filepath):
                 os.makedirs(self.current_filepath)
+
+            # Seed the size counter once; later changes are tracked as we make them
+            self.folder_files = self._scan_folder(self.current_filepath)
+            self.folder_bytes = sum(self.folder_files.values())
+            self.folder_reconciled_at = time.monotonic()
         else:
             target_file = self.config.get('target_file')
             start_count = self.config.get('start_count', None)
@@ -87,15 +276,15 @@ class ScreenshotSession:
             if target_file and os.path.exists(target_file):
                 self.current_filepath = target_file
                 try:
-                    self.document = Document(target_file)
+                    self.writer = DocxWriter(target_file)
                 except Exception:
-                    self.document = Document()
+                    self.writer = DocxWriter.create(target_file)
                 # Initialize count and size from the existing doc
                 try:
                     if start_count is not None:
                         self.screenshot_count = int(start_count)
                     else:
-                        self.screenshot_count = len(self.document.inline_shapes)
+                        self.screenshot_count = capture_count(target_file)
                 except Exception:
                     self.screenshot_count = 0
                 self.last_size_str = self._get_file_size(target_file)
@@ -119,9 +308,8 @@ class ScreenshotSession:
                 self.created_docs = set()
             else:
                 self.current_filepath, self.root_name = self._get_unique_file(save_dir, filename_input)
-                self.document = Document()
                 try:
-                    self.document.save(self.current_filepath)
+                    self.writer = DocxWriter.create(self.current_filepath)
                 except OSError:
                     pass
                 # New session owns this document
@@ -133,8 +321,92 @@ class ScreenshotSession:
         except (ValueError, TypeError):
             self.max_size_bytes = 0
 
+        try:
+            self.folder_reconcile_interval = float(self.config.get('folder_reconcile_s', 60))
+        except (ValueError, TypeError):
+            self.folder_reconcile_interval = 60.0
+
+        # Pixels stored per picture in a DOCX: enough for docx_dpi at the embed
+        # width. Folder mode always keeps the full-resolution frame.
+        self.embed_max_width = None
+        try:
+            docx_dpi = float(self.config.get('docx_dpi', 0))
+        except (ValueError, TypeError):
+            docx_dpi = 0
+        if docx_dpi > 0 and self.config['save_mode'] != 'folder':
+            self.embed_max_width = int(EMBED_WIDTH_INCHES * docx_dpi)
+
+        # Output format: one fixed format, or "auto" for the smallest within a time budget
+        image_format = str(self.config.get('image_format', 'jpeg')).lower()
+        if image_format == "auto":
+            formats = ("png", "webp", "jpeg")
+        else:
+            formats = (image_format,) if image_format in FORMAT_EXTENSIONS else ("jpeg",)
+        if self.config['save_mode'] != 'folder' or not features.check("webp"):
+            # Word does not reliably display WebP pictures
+            formats = tuple(f for f in formats if f != "webp") or ("jpeg",)
+        try:
+            budget_s = max(0.0, float(self.config.get('format_budget_ms', 40)) / 1000)
+        except (ValueError, TypeError):
+            budget_s = 0.04
+        self.encode_settings = EncodeSettings(formats, budget_s, self.embed_max_width)
+
+        try:
+            self.undo_levels = max(0, int(self.config.get('undo_levels', 100)))
+        except (ValueError, TypeError):
+            self.undo_levels = 100
+
+        # Drop media left unused by undo when a part is finished
+        self.compact_docx = self.config.get('compact_docx', True)
+
+        self.dedupe_mode = str(self.config.get('dedupe_mode', 'off')).lower()
+        try:
+            self.dedupe_threshold = int(self.config.get('dedupe_threshold', 2))
+        except (ValueError, TypeError):
+            self.dedupe_threshold = 2
+
+        # Group commit: captures queued together are saved with a single commit
+        self.group_commit = self.config.get('group_commit', True)
+        try:
+            self.group_commit_delay = max(0.0, float(self.config.get('group_commit_ms', DEFAULT_GROUP_COMMIT_MS))
+                                          / 1000)
+        except (ValueError, TypeError):
+            self.group_commit_delay = DEFAULT_GROUP_COMMIT_MS / 1000
+
         self.temp_dir = tempfile.mkdtemp(prefix="Click_")
-        self._start_workers()
+
+        # Memory budget for frames waiting in the save/clipboard queues
+        try:
+            pending_limit = int(float(self.config.get('max_pending_mb', 512)) * 1024 * 1024)
+        except (ValueError, TypeError):
+            pending_limit = 512 * 1024 * 1024
+        self.frame_budget = FrameBudget(pending_limit, self.temp_dir)
+
+        # Optional encoding stage: frames are encoded on worker processes as
+        # soon as they are captured, and still committed in capture order
+        if self.config.get('parallel_encode', False):
+            try:
+                self.encoder_pool = get_encoder_pool()
+            except (OSError, ImportError):
+                self.encoder_pool = None
+        self.artifacts = ArtifactCache(self.encoder_pool)
+
+        self.fsync_policy = str(self.config.get('fsync', 'rotation')).lower()
+        if self.fsync_policy not in ("none", "rotation", "commit"):
+            self.fsync_policy = "rotation"
+
+        if self.config['save_mode'] != 'folder' and self.config.get('journal', True):
+            try:
+                self.journal = CaptureJournal(self.config.get('journal_dir') or default_journal_dir(),
+                                              self.current_filepath, sync=self.fsync_policy == "commit")
+            except OSError as e:
+                print(f"Journal Error: {e}")
+
+        # Latency logging is opt-in; a relative path lives beside the evidence, not in the working directory
+        metrics_file = self.config.get('metrics_file') or None
+        if metrics_file and not os.path.isabs(metrics_file):
+            metrics_file = os.path.join(self.config['save_dir'], metrics_file)
+        self.metrics = SessionMetrics(os.path.basename(self.current_filepath), metrics_file)
 
     def _get_unique_path(self, path: str) -> str:
         counter = 1
@@ -153,128 +425,407 @@ class ScreenshotSession:
                 return file_path, new_name
             counter += 1
 
-    def _start_workers(self):
-        if not self.save_thread or not self.save_thread.is_alive():
-            self.save_thread = threading.Thread(target=self._save_worker, daemon=True)
-            self.save_thread.start()
-
-        if not self.clipboard_thread or not self.clipboard_thread.is_alive():
-            self.clipboard_thread = threading.Thread(target=self._clipboard_worker, daemon=True)
-            self.clipboard_thread.start()
-
     def stop(self):
         self.is_running = False
-        if self.document:
+        if self.writer:
             try:
-                self.document.save(self.current_filepath)
+                self._commit_writer()
             except OSError:
                 pass
 
-    def capture(self):
+    def _commit_writer(self, final=False):
+        """
+        Commits the document; the journal then only needs the events staged after.
+        final marks the last commit of a part, at rotation or close.
+        """
+        sync = self.fsync_policy == "commit" or (final and self.fsync_policy == "rotation")
+        with self.commit_lock:
+            self.writer.commit(sync=sync)
+            if self.journal:
+                self.journal.checkpoint(through=self.journal_seq)
+
+    def capture(self, hotkey_at: Optional[float] = None):
+        """hotkey_at is the perf_counter() time the hotkey was received, if known."""
         if not self.is_running:
             return
 
+        entered = time.perf_counter()
         try:
-            image = ImageGrab.grab(all_screens=True)
+            image = self.capture_backend.grab(self._capture_bbox())
         except Exception:
             return
+        grab_seconds = time.perf_counter() - entered
+
+        if self.dedupe_mode in ("skip", "caption"):
+            image_hash = frame_hash(image)
+            if (self.last_frame_hash is not None
+                    and hash_distance(image_hash, self.last_frame_hash) <= self.dedupe_threshold):
+                self._record_duplicate()
+                return
+            self.last_frame_hash = image_hash
 
         self.screenshot_count += 1
-        window_title = self._get_active_window_title() if self.config['log_title'] else None
+        self.last_frame_count = self.screenshot_count
+        title_started = time.perf_counter()
+        window_title = self.read_window_title() if self.config['log_title'] else None
+        title_seconds = time.perf_counter() - title_started
 
         # Do not emit a pre-save notification; we will notify after save completes with exact size
 
+        # We need the image data if we are copying the image directly OR if we need to save the file for file-copy
+        should_pass_image = self.config['auto_copy'] and (
+                self.config.get('copy_image', True) or self.config.get('copy_files', True))
+        consumers = 2 if should_pass_image else 1
+        if self.journal:
+            consumers += 1
+        frame = PendingFrame(image, consumers=consumers)
+        del image
+        self.frame_budget.admit(frame)
+        self._post_queue_stats()
+
+        # Each capture is encoded once; save, clipboard and journal share the bytes
+        capture_id = self._next_event(("capture", frame, self.screenshot_count, window_title),
+                                      lambda seq: self.artifacts.register(seq, frame, consumers,
+                                                                          self.encode_settings))
+
+        timing = CaptureTiming(self.screenshot_count, hotkey_at or entered,
+                               2 if self.config['auto_copy'] else 1)
+        if hotkey_at:
+            timing.add("hotkey", entered - hotkey_at)
+        timing.add("grab", grab_seconds)
+        if self.config['log_title']:
+            timing.add("title", title_seconds)
+        self.timings[capture_id] = timing
+
         if self.config['auto_copy']:
-            if self.config['save_mode'] == "folder":
-                fname = f"{self.base_filename}_{self.screenshot_count}.jpg"
+            # The extension is only known once the format has been picked
+            temp_stem = self._capture_file_stem(self.screenshot_count)
+            copy_img_data = frame if should_pass_image else None
+
+            # Cumulative auto-copy: the worker adds this file to the list it has published so far
+            self.clipboard_queue.put((copy_img_data, temp_stem, capture_id))
+
+        timing.enqueued = time.perf_counter()
+        self.save_queue.put((frame, self.screenshot_count, window_title, capture_id))
+
+    def _next_event(self, event, register=None):
+        """
+        Numbers a capture, duplicate, undo or redo and queues it for the
+        journal, so journal order is event order. register(seq) runs first,
+        before the journal can look the event up. Returns the sequence number.
+        """
+        with self.event_lock:
+            self.capture_seq += 1
+            seq = self.capture_seq
+            if register:
+                register(seq)
+            if self.journal:
+                self.journal_queue.put((seq,) + event)
+        return seq
+
+    def _handle_journal_event(self, event):
+        seq, kind = event[0], event[1]
+        try:
+            if kind == "capture":
+                frame, count, window_title = event[2:]
+                try:
+                    # Encoding here starts it early; the save path then finds the bytes ready
+                    data, image_format = self.artifacts.get(seq)
+                    self.journal.append("capture", seq, {"count": count, "caption": self._caption(count, window_title),
+                                                         "format": image_format, "size": list(frame.size)}, data)
+                finally:
+                    self.artifacts.release(seq)
+                    self._release_frame(frame)
+            elif kind == "duplicate":
+                count, window_title, previous_count = event[2:]
+                self.journal.append("duplicate", seq,
+                                    {"count": count, "lines": self._duplicate_lines(count, window_title,
+                                                                                    previous_count)})
             else:
-                fname = f"screen_{self.screenshot_count}.jpg"
-
-            temp_path = os.path.join(self.temp_dir, fname)
-
-            # We need the image data if we are copying the image directly OR if we need to save the file for file-copy
-            should_pass_image = self.config.get('copy_image', True) or self.config.get('copy_files', True)
-            copy_img_data = image if should_pass_image else None
-
-            # Cumulative auto-copy: include all previous files + current one
-            all_files = list(self.captured_images) + [temp_path]
-            self.clipboard_queue.put((copy_img_data, temp_path, all_files))
-
-        self.save_queue.put((image, self.screenshot_count, window_title))
+                self.journal.append(kind, seq)
+        except Exception as e:
+            print(f"Journal Error: {e}")
+
+    def _caption(self, count, window_title):
+        if window_title and self.config['append_num']:
+            return f"{count} | {window_title}"
+        if window_title:
+            return window_title
+        if self.config['append_num']:
+            return str(count)
+        return ""
+
+    def _duplicate_lines(self, count, window_title, previous_count):
+        caption = self._caption(count, window_title)
+        lines = [caption] if caption else []
+        return lines + [f"(No change since capture #{previous_count})", "-" * 50]
+
+    def _capture_stem(self, count):
+        """File name of a capture without its extension."""
+        if self.config['save_mode'] == "folder":
+            return f"{self.base_filename}_{count}"
+        return f"screen_{count}"
+
+    def _capture_file_stem(self, count):
+        """Path of a capture's file without its extension: in the session folder, or in the temp folder."""
+        directory = self.current_filepath if self.config['save_mode'] == "folder" else self.temp_dir
+        return os.path.join(directory, self._capture_stem(count))
+
+    def _capture_bbox(self):
+        """
+        Area to grab for the configured capture mode; None grabs every monitor.
+        Cropping happens in the grab, so nothing outside it is encoded or queued.
+        """
+        if self.capture_mode == "foreground_monitor":
+            return self.capture_backend.foreground_monitor()
+        if self.capture_mode == "active_window":
+            # Same foreground window _get_active_window_title reports
+            return self.capture_backend.foreground_window()
+        if self.capture_mode == "region":
+            return self.capture_region
+        return None
+
+    def queue_stats(self):
+        """Returns (pending frames, bytes held in memory, bytes spilled to disk)."""
+        budget = self.frame_budget
+        return budget.depth, budget.bytes_held, budget.bytes_spilled
+
+    def _post_queue_stats(self):
+        self.gui_queue.put(("QUEUE", self.session_id, *self.queue_stats()))
+
+    def _release_frame(self, frame):
+        self.frame_budget.release(frame)
+        self._post_queue_stats()
+
+    def _record_duplicate(self):
+        """Handles a frame that matches the last stored one."""
+        # Folder mode has nowhere to put a caption on its own, so it always skips
+        if self.dedupe_mode == "caption" and self.config['save_mode'] != "folder":
+            self.screenshot_count += 1
+            window_title = self.read_window_title() if self.config['log_title'] else None
+            seq = self._next_event(("duplicate", self.screenshot_count, window_title, self.last_frame_count))
+            self.save_queue.put(("DUPLICATE", self.screenshot_count, window_title, self.last_frame_count, seq))
+        else:
+            self.gui_queue.put(("DUPLICATE", self.session_id, self.screenshot_count))
 
     def undo(self):
         if self.is_running:
-            self.save_queue.put(("UNDO", None, None))
+            # The stored frame this hash described may be the one being undone
+            self.last_frame_hash = None
+            self.save_queue.put(("UNDO", self._next_event(("undo",)), None))
+
+    def redo(self):
+        if self.is_running:
+            self.last_frame_hash = None
+            self.save_queue.put(("REDO", self._next_event(("redo",)), None))
 
     def manual_rotate(self):
         if self.config['save_mode'] != "folder":
             self.save_queue.put(("ROTATE", None, None))
 
-    def _save_worker(self):
-        while True:
-            try:
-                try:
-                    task = self.save_queue.get(timeout=0.1)
-                except queue.Empty:
-                    if not self.is_running and self.save_queue.empty():
-                        break
-                    continue
+    def _handle_save_task(self, task):
+        try:
+            if task[0] in CONTROL_TASKS:
+                self._run_control_task(task)
+                self.save_queue.task_done()
+                return
 
-                if task[0] == "UNDO":
-                    self._perform_undo()
-                elif task[0] == "ROTATE":
-                    self._rotate_file()
-                else:
-                    self._perform_save(*task)
+            if not self.group_commit:
+                self._stage_task(task)
+                self._commit_saves()
+                self.save_queue.task_done()
+                return
 
+            batch, control_task = self._collect_batch(task)
+            for capture_task in batch:
+                self._stage_task(capture_task)
+            self._commit_saves()
+            for _ in batch:
                 self.save_queue.task_done()
-            except Exception as e:
-                print(f"Worker Error: {e}")
 
-    def _perform_save(self, image, count, window_title):
-        try:
-            if self.config['save_mode'] == "folder":
-                filename = f"{self.base_filename}_{count}.jpg"
-            else:
-                filename = f"screen_{count}.jpg"
+            # A control task ends the batch and runs after the captures queued before it
+            if control_task:
+                self._run_control_task(control_task)
+                self.save_queue.task_done()
+        except Exception as e:
+            print(f"Worker Error: {e}")
+
+    def _collect_batch(self, first_task):
+        """
+        Gathers the captures queued behind first_task. A lone capture is
+        committed at once; a burst waits for more, up to group_commit_delay
+        seconds in all and GROUP_COMMIT_GAP between captures. Stops early at an
+        UNDO/REDO/ROTATE task, which is returned separately so it keeps its place.
+        """
+        batch = [first_task]
+        deadline = time.monotonic() + self.group_commit_delay
+        while True:
+            remaining = min(deadline - time.monotonic(), GROUP_COMMIT_GAP)
+            try:
+                if len(batch) > 1 and remaining > 0:
+                    task = self.save_queue.get(timeout=remaining)
+                else:
+                    task = self.save_queue.get_nowait()
+            except queue.Empty:
+                return batch, None
 
-            image_path = os.path.join(self.temp_dir, filename)
+            if task[0] in CONTROL_TASKS:
+                return batch, task
+            batch.append(task)
 
-            with self.save_lock:
-                if not os.path.exists(image_path):
-                    image.save(image_path, "JPEG", quality=90, subsampling=0)
+    def _stage_task(self, task):
+        if task[0] == "DUPLICATE":
+            self._perform_duplicate(*task[1:])
+        else:
+            self._perform_save(*task, commit=False)
 
-            self.captured_images.append(image_path)
+    def _perform_duplicate(self, count, window_title, previous_count, seq):
+        """Records only a caption that points back at the unchanged capture."""
+        try:
+            if not self.writer:
+                self.writer = DocxWriter(self.current_filepath)
+
+            with self.commit_lock:
+                mark = self.writer.mark()
+                for line in self._duplicate_lines(count, window_title, previous_count):
+                    self.writer.add_paragraph(line)
+                self.journal_seq = seq
+                # Marks are block indexes, so the group is taken before anything else can edit the body
+                group = self.writer.group_since(mark)
+            self.duplicate_counts.add(count)
+            self._push_undo(CaptureRecord(count, group, duplicate=True))
+        except Exception as e:
+            print(f"Save Error: {e}")
+
+    def _run_control_task(self, task):
+        if task[0] in ("UNDO", "REDO"):
+            # The edit's own commit covers its journal record
+            with self.commit_lock:
+                self.journal_seq = task[1]
+        if task[0] == "UNDO":
+            self._perform_undo()
+        elif task[0] == "REDO":
+            self._perform_redo()
+        elif task[0] == "ROTATE":
+            self._rotate_file()
+
+    def _perform_save(self, frame, count, window_title, capture_id, commit=True):
+        timing = self.timings.get(capture_id)
+        if timing:
+            timing.add("queue_wait", time.perf_counter() - timing.enqueued)
+        try:
+            image_data, image_format = self.artifacts.get(capture_id)
+            image_path = f"{self._capture_file_stem(count)}.{FORMAT_EXTENSIONS[image_format]}"
+            encode_seconds = self.artifacts.encode_seconds(capture_id)
+            if timing and encode_seconds is not None:
+                timing.add("encode", encode_seconds)
 
             if self.config['save_mode'] == "folder":
-                shutil.copyfile(image_path, os.path.join(self.current_filepath, filename))
-                self.last_size_str = self._get_folder_size(self.current_filepath)
+                # Written once, straight into the session folder
+                started = time.perf_counter()
+                self.artifacts.write_file(capture_id, image_path)
+                self.captured_images.append(image_path)
+                self._track_folder_file(image_path, len(image_data))
+                self._push_undo(CaptureRecord(count, image_path=image_path, folder_path=image_path))
+                if timing:
+                    timing.add("save", time.perf_counter() - started)
             else:
-                if os.path.exists(self.current_filepath) and self.max_size_bytes > 0:
-                    current_size = os.path.getsize(self.current_filepath)
-                    if (current_size + os.path.getsize(image_path)) > self.max_size_bytes:
+                if not self.writer:
+                    self.writer = DocxWriter(self.current_filepath)
+
+                caption = self._caption(count, window_title)
+
+                # Stage first, then decide on rotation from the exact size the
+                # commit would produce, so no part is ever written over the limit
+                started = time.perf_counter()
+                with self.commit_lock:
+                    had_content = self.writer.block_count > 0
+                    mark = self.writer.mark()
+                    media_name = self._stage_docx_capture(caption, image_data, image_format, frame.size)
+
+                    if had_content and self._exceeds_max_size():
+                        self.writer.rollback(mark)
+                        # If the part cannot be finished, the capture goes over the limit rather than being lost
                         self._rotate_file()
-
-                if not self.document:
-                    self.document = Document(self.current_filepath)
-
-                caption = ""
-                if window_title and self.config['append_num']:
-                    caption = f"{count} | {window_title}"
-                elif window_title:
-                    caption = window_title
-                elif self.config['append_num']:
-                    caption = str(count)
-
-                if caption:
-                    self.document.add_paragraph(caption)
-
-                self.document.add_picture(image_path, width=Inches(6))
-                self.document.add_paragraph("-" * 50)
-
+                        mark = self.writer.mark()
+                        media_name = self._stage_docx_capture(caption, image_data, image_format, frame.size)
+                    self.journal_seq = capture_id
+                    group = self.writer.group_since(mark)
+                # The picture is read back from the document if a file is ever needed
+                with self.unwritten_lock:
+                    self.unwritten_files[image_path] = (self.current_filepath, media_name)
+                self.captured_images.append(image_path)
+                self._push_undo(CaptureRecord(count, group, image_path=image_path))
+                if timing:
+                    timing.add("add_picture", time.perf_counter() - started)
+        except Exception as e:
+            print(f"Save Error: {e}")
+        finally:
+            self.artifacts.release(capture_id)
+            self._release_frame(frame)
+            self.staged_captures.append(capture_id)
+
+        if commit:
+            self._commit_saves()
+
+    def _stage_docx_capture(self, caption, image_data, image_format, pixel_size):
+        return stage_capture(self.writer, caption, image_data, image_format, pixel_size)
+
+    def _read_capture(self, path) -> Optional[bytes]:
+        """Encoded bytes of a capture, from its file or from the document holding it."""
+        with self.unwritten_lock:
+            source = self.unwritten_files.get(path)
+        if os.path.exists(path) or source is None:
+            try:
+                with open(path, "rb") as f:
+                    return f.read()
+            except OSError:
+                return None
+        document, media_name = source
+        writer = self.writer
+        try:
+            if writer and document == writer.path:
+                return writer.read_media(media_name)
+            return read_media(document, media_name)
+        except (OSError, KeyError, zipfile.BadZipFile):
+            return None
+
+    def _write_capture_files(self, paths):
+        """Gives DOCX captures that only live in the document a file, for a clipboard file list."""
+        for path in list(paths):
+            with self.unwritten_lock:
+                if path not in self.unwritten_files:
+                    continue
+            if not os.path.exists(path):
+                data = self._read_capture(path)
+                if data is None:
+                    continue
+                with open(path, "wb") as f:
+                    f.write(data)
+            with self.unwritten_lock:
+                self.unwritten_files.pop(path, None)
+
+    def _exceeds_max_size(self):
+        if self.max_size_bytes <= 0:
+            return False
+        # The bound needs no compression; the exact size is only computed near the limit
+        if self.writer.size_upper_bound() <= self.max_size_bytes:
+            return False
+        return self.writer.projected_size() > self.max_size_bytes
+
+    def _commit_saves(self):
+        """Persists everything staged by _perform_save and sends one notification."""
+        staged, self.staged_captures = self.staged_captures, []
+        started = time.perf_counter()
+        try:
+            if self.config['save_mode'] == "folder":
+                self.last_size_str = self._format_size(self.folder_bytes)
+                self._maybe_reconcile_folder()
+            elif self.writer:
                 try:
-                    self.document.save(self.current_filepath)
-                    self.last_size_str = self._get_file_size(self.current_filepath)
+                    # Only the new media parts and the document tail are written
+                    self._commit_writer()
+                    self.last_size_str = self._format_size(self.writer.size)
                     self.warning_shown = False
                 except PermissionError:
                     if not self.warning_shown:
@@ -288,52 +839,125 @@ class ScreenshotSession:
         except Exception as e:
             print(f"Save Error: {e}")
 
+        notified = time.perf_counter()
+        for capture_id in staged:
+            timing = self.timings.get(capture_id)
+            if timing:
+                timing.add("save", notified - started)
+                timing.add("total", notified - timing.started)
+                self._finish_timing(capture_id)
+
+    def _finish_timing(self, capture_id):
+        """Records a capture's stages once both the save and clipboard paths are done."""
+        timing = self.timings.get(capture_id)
+        if timing and self.metrics.finish(timing):
+            del self.timings[capture_id]
+            self.gui_queue.put(("METRICS", self.session_id, self.metrics.summary()))
+
+    def _push_undo(self, record: CaptureRecord):
+        """Records a new capture; anything undone before it can no longer be redone."""
+        self.undo_stack.append(record)
+        if len(self.undo_stack) > self.undo_levels:
+            del self.undo_stack[:len(self.undo_stack) - self.undo_levels]
+        self._discard_redo()
+
+    def _discard_redo(self):
+        for record in self.redo_stack:
+            if record.stashed_path and os.path.exists(record.stashed_path):
+                try:
+                    os.remove(record.stashed_path)
+                except OSError:
+                    pass
+        self.redo_stack = []
+
     def _perform_undo(self):
-        if self.screenshot_count <= 0:
+        if not self.undo_stack:
             return
 
         try:
-            if self.captured_images:
-                path = self.captured_images.pop()
-                if os.path.exists(path):
-                    os.remove(path)
-
-            if self.config['save_mode'] == 'folder':
-                file_to_remove = os.path.join(self.current_filepath,
-                                              f"{self.base_filename}_{self.screenshot_count}.jpg")
-                if os.path.exists(file_to_remove):
-                    os.remove(file_to_remove)
-                self.last_size_str = self._get_folder_size(self.current_filepath)
-
-            elif self.document and len(self.document.paragraphs) >= 2:
-                try:
-                    removed_count = 0
-                    while removed_count < 3 and self.document.paragraphs:
-                        p = self.document.paragraphs[-1]
-                        p._element.getparent().remove(p._element)
-                        removed_count += 1
-                        if removed_count == 1 and "-" not in p.text and len(p.text) > 0:
-                            break
-
-                    self.document.save(self.current_filepath)
-                    self.last_size_str = self._get_file_size(self.current_filepath)
-                except Exception:
-                    pass
-
+            record = self.undo_stack.pop()
+            if record.group is not None and self.writer:
+                self.writer.remove_group(record.group)
+            if record.duplicate:
+                self.duplicate_counts.discard(record.count)
+
+            if record.image_path:
+                if self.captured_images and self.captured_images[-1] == record.image_path:
+                    self.captured_images.pop()
+                elif record.image_path in self.captured_images:
+                    self.captured_images.remove(record.image_path)
+                self.clipboard_files.remove(record.image_path)
+                if os.path.exists(record.image_path):
+                    # Kept aside in the temp folder so a redo does not need to encode again
+                    stash_dir = os.path.join(self.temp_dir, "undone")
+                    os.makedirs(stash_dir, exist_ok=True)
+                    record.stashed_path = os.path.join(stash_dir, os.path.basename(record.image_path))
+                    # The session folder may be on another drive than the temp folder
+                    shutil.move(record.image_path, record.stashed_path)
+
+            if record.folder_path:
+                self._untrack_folder_file(record.folder_path)
+
+            self.redo_stack.append(record)
             self.screenshot_count -= 1
+            self._commit_edit()
             self.gui_queue.put(("UNDO", self.session_id, self.screenshot_count, self.last_size_str))
-        except Exception:
-            pass
+        except Exception as e:
+            print(f"Undo Error: {e}")
+
+    def _perform_redo(self):
+        if not self.redo_stack:
+            return
+
+        try:
+            record = self.redo_stack.pop()
+            if record.stashed_path:
+                shutil.move(record.stashed_path, record.image_path)
+                record.stashed_path = None
+            if record.image_path:
+                self.captured_images.append(record.image_path)
+                if self.config['auto_copy'] and self.config.get('copy_files', True):
+                    self._write_capture_files([record.image_path])
+                    self.clipboard_files.append(record.image_path)
+
+            if record.folder_path:
+                self._track_folder_file(record.folder_path, os.path.getsize(record.folder_path))
+            if record.group is not None and self.writer:
+                self.writer.restore_group(record.group)
+            if record.duplicate:
+                self.duplicate_counts.add(record.count)
+
+            self.undo_stack.append(record)
+            self.screenshot_count += 1
+            self._commit_edit()
+            self.gui_queue.put(("REDO", self.session_id, self.screenshot_count, self.last_size_str))
+        except Exception as e:
+            print(f"Redo Error: {e}")
+
+    def _commit_edit(self):
+        """Persists an undo/redo; only the document tail is rewritten."""
+        if self.config['save_mode'] == 'folder':
+            self.last_size_str = self._format_size(self.folder_bytes)
+        elif self.writer:
+            try:
+                self._commit_writer()
+                self.last_size_str = self._format_size(self.writer.size)
+            except OSError as e:
+                print(f"Save Error: {e}")
 
     def cleanup(self, delete_files=False):
         self.stop()
-        if self.temp_dir and os.path.exists(self.temp_dir):
-            try:
-                shutil.rmtree(self.temp_dir)
-            except OSError:
-                pass
+        if not delete_files:
+            # Not a daemon, so closing the app lets queued captures land first
+            self.finish_thread = threading.Thread(target=self._finish_session)
+            self.finish_thread.start()
+            return
+
+        if self.journal:
+            self.journal.close()
+        self._remove_temp_dir()
 
-        if delete_files and self.current_filepath:
+        if self.current_filepath:
             try:
                 if self.config['save_mode'] == 'folder':
                     if os.path.exists(self.current_filepath):
@@ -375,13 +999,55 @@ class ScreenshotSession:
             except OSError:
                 pass
 
-    def _rotate_file(self):
-        if self.document:
+    def _finish_session(self):
+        """Waits for queued saves, then commits, drops the journal and compacts."""
+        self.journal_queue.wait_idle()
+        self.save_queue.wait_idle()
+        self.clipboard_queue.wait_idle()
+        if self.writer:
             try:
-                self.document.save(self.current_filepath)
+                self._commit_writer(final=True)
+            except OSError as e:
+                # The journal stays behind, so the captures are recovered on the next start
+                print(f"Save Error: {e}")
+                self._remove_temp_dir()
+                return
+            self.writer = None
+        if self.journal:
+            self.journal.close()
+        self._remove_temp_dir()
+        if self.config['save_mode'] != 'folder':
+            self._compact_file(self.current_filepath)
+
+    def _remove_temp_dir(self):
+        if self.temp_dir and os.path.exists(self.temp_dir):
+            try:
+                shutil.rmtree(self.temp_dir)
             except OSError:
                 pass
-        self.document = None
+
+    def _rotate_file(self):
+        """Finishes the current part and starts the next; returns False if the part could not be saved."""
+        if self.writer:
+            try:
+                self._commit_writer(final=True)
+            except OSError as e:
+                # Keep the part open with its staged captures, and the journal pointing at it;
+                # the next commit or rotation tries again
+                print(f"Save Error: {e}")
+                if not self.warning_shown:
+                    if isinstance(e, PermissionError):
+                        warning = ("File Locked", "Please close the Word document to continue saving.")
+                    else:
+                        warning = ("Save Error", f"Could not finish {os.path.basename(self.current_filepath)}: {e}")
+                    self.gui_queue.put(("WARNING",) + warning)
+                    self.warning_shown = True
+                return False
+        self.writer = None
+        # Undo and redo stay within one part; earlier parts are finished
+        self.undo_stack = []
+        self._discard_redo()
+        finished_path = self.current_filepath
 
         directory = os.path.dirname(self.current_filepath)
         base = os.path.basename(self.current_filepath).rsplit('.', 1)[0]
@@ -406,21 +1072,47 @@ class ScreenshotSession:
             if os.path.exists(self.current_filepath):
                 try:
                     os.rename(self.current_filepath, part1_path)
+                    finished_path = part1_path
+                    with self.unwritten_lock:
+                        for path, (document, media_name) in self.unwritten_files.items():
+                            if document == self.current_filepath:
+                                self.unwritten_files[path] = (part1_path, media_name)
                 except OSError:
                     pass
 
             new_name = f"{root_name}_Part{counter + 1}.docx"
             self.current_filepath = os.path.join(directory, new_name)
 
-        self.document = Document()
-        self.document.save(self.current_filepath)
+        self.writer = DocxWriter.create(self.current_filepath)
+        if self.journal:
+            # Records after the finished part's last commit belong to the new part
+            self.journal.checkpoint(self.current_filepath)
         self.last_size_str = "0 KB"
         self.gui_queue.put(("UPDATE_FILENAME", self.session_id, self.current_filepath))
+        self._compact_in_background(finished_path)
         # Track newly created rotated document
         try:
             self.created_docs.add(self.current_filepath)
         except Exception:
             pass
+        return True
+
+    def _compact_in_background(self, path):
+        if not self.compact_docx or not path or not os.path.exists(path):
+            return
+        # Not a daemon, so closing the app lets a compaction that has started finish
+        threading.Thread(target=self._compact_file, args=(path,)).start()
+
+    def _compact_file(self, path):
+        if not self.compact_docx or not path or not os.path.exists(path):
+            return
+        try:
+            reclaimed = compact(path)
+        except Exception as e:
+            print(f"Compact Error: {e}")
+            return
+        if reclaimed > 0:
+            self.gui_queue.put(("COMPACTED", self.session_id, path, self._format_size(reclaimed)))
 
     def _get_active_window_title(self):
         try:
@@ -439,98 +1131,165 @@ class ScreenshotSession:
         size = os.path.getsize(path)
         return f"{size / 1024:.2f} KB" if size < 1048576 else f"{size / 1048576:.2f} MB"
 
-    def _get_folder_size(self, path):
-        total = sum(os.path.getsize(os.path.join(r, f)) for r, _, fs in os.walk(path) for f in fs)
-        return f"{total / 1024:.2f} KB" if total < 1048576 else f"{total / 1048576:.2f} MB"
-
     def _get_folder_size_bytes(self, path):
         return sum(os.path.getsize(os.path.join(r, f)) for r, _, fs in os.walk(path) for f in fs)
 
     def _format_size(self, size):
         return f"{size / 1024:.2f} KB" if size < 1048576 else f"{size / 1048576:.2f} MB"
 
-    def _clipboard_worker(self):
-        while True:
-            try:
+    def _scan_folder(self, path) -> Dict[str, int]:
+        sizes = {}
+        for r, _, fs in os.walk(path):
+            for f in fs:
+                file_path = os.path.join(r, f)
+                try:
+                    sizes[file_path] = os.path.getsize(file_path)
+                except OSError:
+                    pass
+        return sizes
+
+    def _track_folder_file(self, path, size):
+        """Records a file we wrote into the session folder."""
+        with self.folder_lock:
+            self.folder_bytes += size - self.folder_files.get(path, 0)
+            self.folder_files[path] = size
+            if self.folder_reconciling:
+                self.folder_touched.add(path)
+
+    def _untrack_folder_file(self, path):
+        """Records a file we deleted from the session folder."""
+        with self.folder_lock:
+            self.folder_bytes -= self.folder_files.pop(path, 0)
+            if self.folder_reconciling:
+                self.folder_touched.add(path)
+
+    def _maybe_reconcile_folder(self):
+        """Occasionally re-walks the folder in the background to correct drift from outside changes."""
+        with self.folder_lock:
+            if self.folder_reconciling:
+                return
+            if time.monotonic() - self.folder_reconciled_at < self.folder_reconcile_interval:
+                return
+            self.folder_reconciling = True
+            self.folder_touched = set()
+        threading.Thread(target=self._reconcile_folder, daemon=True).start()
+
+    def _reconcile_folder(self):
+        try:
+            scanned = self._scan_folder(self.current_filepath)
+        except OSError:
+            scanned = None
+        with self.folder_lock:
+            if scanned is not None:
+                # Files we touched during the walk keep their tracked sizes
+                for path in self.folder_touched:
+                    if path in self.folder_files:
+                        scanned[path] = self.folder_files[path]
+                    else:
+                        scanned.pop(path, None)
+                self.folder_files = scanned
+                self.folder_bytes = sum(scanned.values())
+            self.folder_reconciling = False
+            self.folder_reconciled_at = time.monotonic()
+
+    def _handle_clipboard_item(self, item):
+        try:
+            # Only the newest clipboard state matters, so everything queued
+            # behind this item is folded into a single clipboard write
+            items = [item]
+            while True:
                 try:
-                    item = self.clipboard_queue.get(timeout=0.1)
+                    items.append(self.clipboard_queue.get_nowait())
                 except queue.Empty:
-                    if not self.is_running:
-                        break
-                    continue
+                    break
+            try:
+                self._publish_to_clipboard(items)
+            finally:
+                for _ in items:
+                    self.clipboard_queue.task_done()
+        except Exception as e:
+            print(f"Clipboard Error: {e}")
 
-                # Unpack arguments (handle legacy 2-item tuple if needed, though we updated capture)
-                if len(item) == 3:
-                    image_data, save_path, clipboard_files = item
-                else:
-                    image_data, save_path = item
-                    clipboard_files = [save_path]
-
-                # Ensure the file exists for file-copy (save current capture if needed)
-                if image_data:
-                    with self.save_lock:
-                        if not os.path.exists(save_path):
-                            image_data.convert("RGB").save(save_path, "JPEG", quality=90, subsampling=0)
-                            time.sleep(0.05)
-
-                # Copy to clipboard (using the cumulative list 'clipboard_files')
-                self.copy_to_clipboard(image_data, clipboard_files)
-                self.clipboard_queue.task_done()
-            except Exception as e:
-                print(f"Clipboard Error: {e}")
+    def _publish_to_clipboard(self, items):
+        """Adds each capture's file to the cumulative list, then copies the newest state once."""
+        image_data = None
+        try:
+            for frame, temp_stem, capture_id in items:
+                # A file is only needed for the file list; in folder mode it is the saved capture itself
+                if not frame or not self.config.get('copy_files', True):
+                    continue
+                _, image_format = self.artifacts.get(capture_id)
+                save_path = f"{temp_stem}.{FORMAT_EXTENSIONS[image_format]}"
+                self.artifacts.write_file(capture_id, save_path)
+                self.clipboard_files.append(save_path)
+
+            newest_frame, _, newest_id = items[-1]
+            if newest_frame and self.config.get('copy_image', True):
+                image_data = newest_frame.load()
+
+            started = time.perf_counter()
+            self.copy_to_clipboard(image_data, self.clipboard_files)
+            timing = self.timings.get(newest_id)
+            if timing:
+                timing.add("clipboard", time.perf_counter() - started)
+        finally:
+            for frame, _, capture_id in items:
+                if frame:
+                    self.artifacts.release(capture_id)
+                    self._release_frame(frame)
+                self._finish_timing(capture_id)
+
+    def _open_clipboard(self) -> bool:
+        """Opens the clipboard, backing off briefly while another app holds it."""
+        for delay in CLIPBOARD_RETRY_DELAYS + (None,):
+            try:
+                self.clipboard.OpenClipboard()
+                return True
+            except Exception:
+                if delay is None:
+                    return False
+                time.sleep(delay)
+        return False
 
     def copy_to_clipboard(self, image, file_paths):
+        """file_paths is a FileDropList, or a plain list of paths."""
         copy_img = self.config.get('copy_image', True)
         copy_files = self.config.get('copy_files', True)
 
         if not copy_img and not copy_files:
             return
 
+        if not isinstance(file_paths, FileDropList):
+            file_paths = FileDropList(file_paths or [])
+
         try:
-            # Retry opening clipboard a few times
-            for _ in range(5):
-                try:
-                    win32clipboard.OpenClipboard()
-                    break
-                except Exception:
-                    time.sleep(0.1)
-            else:
+            if not self._open_clipboard():
                 print("Failed to open clipboard after retries")
                 return
 
             try:
-                win32clipboard.EmptyClipboard()
+                self.clipboard.EmptyClipboard()
 
                 # 1. Set File List (CF_HDROP) - Priority for Explorer
                 if copy_files and file_paths:
-                    files_text = "\0".join([os.path.abspath(p) for p in file_paths]) + "\0\0"
-                    files_data = files_text.encode('utf-16le')
-                    # DROPFILES structure: pFiles(4), pt(8), fNC(4), fWide(4)
-                    header = b'\x14\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x01\x00\x00\x00'
-                    drop_data = header + files_data
-                    win32clipboard.SetClipboardData(win32clipboard.CF_HDROP, drop_data)
+                    self.clipboard.SetClipboardData(self.clipboard.CF_HDROP, file_paths.drop_payload())
 
                 # 2. Set Image (CF_DIB) - For Visual History/Paint
                 if copy_img and image:
-                    output = io.BytesIO()
-                    image.convert("RGB").save(output, "BMP")
-                    data = output.getvalue()[14:]
-                    output.close()
-                    win32clipboard.SetClipboardData(win32clipboard.CF_DIB, data)
+                    self.clipboard.SetClipboardData(self.clipboard.CF_DIB, encode_dib(image))
 
                 # 3. Set Text Fallback (CF_UNICODETEXT) - Only if no image
                 # Add text representation so it appears in Win+V history
                 # This also allows pasting file paths as text in editors
                 # Only add text if we are NOT copying an image, otherwise Win+V might show text instead of image
                 if copy_files and file_paths and not (copy_img and image):
-                    display_text = "\r\n".join([os.path.abspath(p) for p in file_paths])
                     try:
-                        win32clipboard.SetClipboardData(win32clipboard.CF_UNICODETEXT, display_text)
+                        self.clipboard.SetClipboardData(self.clipboard.CF_UNICODETEXT, file_paths.text())
                     except Exception:
                         pass  # Non-critical if text fallback fails
 
             finally:
-                win32clipboard.CloseClipboard()
+                self.clipboard.CloseClipboard()
 
         except Exception as e:
             print(f"Clipboard Error: {e}")
@@ -558,8 +1317,9 @@ class ScreenshotSession:
                 self.gui_queue.put(("COPY_PROGRESS", i + 1, total))
 
                 try:
-                    if os.path.exists(img_path):
-                        with Image.open(img_path) as img:
+                    data = self._read_capture(img_path)
+                    if data is not None:
+                        with Image.open(io.BytesIO(data)) as img:
                             # Copy image only to populate history
                             # We don't need to copy files here, just the bitmap for visual history
                             self.copy_to_clipboard(img.copy(), [])
@@ -577,62 +1337,62 @@ class ScreenshotSession:
 
         if self.config.get('copy_image', True):
             try:
-                last_path = self.captured_images[-1]
-                if os.path.exists(last_path):
-                    with Image.open(last_path) as img:
+                data = self._read_capture(self.captured_images[-1])
+                if data is not None:
+                    with Image.open(io.BytesIO(data)) as img:
                         last_image = img.copy()
             except Exception:
                 pass
 
+        if self.config.get('copy_files', True):
+            self._write_capture_files(self.captured_images)
         self.copy_to_clipboard(last_image, self.captured_images)
 
     def copy_master_file_to_clipboard(self):
-        if self.document:
+        if self.writer:
             try:
-                self.document.save(self.current_filepath)
-                # VDI Fix: Explicitly release the file handle
-                self.document = None
-                time.sleep(0.5)
-                # Re-initialize so the session can continue capturing
-                from docx import Document
-                self.document = Document(self.current_filepath)
+                # The writer holds no file handle between commits, so the
+                # file can be handed to other apps straight away
+                self._commit_writer()
             except OSError:
                 pass
         abs_path = os.path.abspath(self.current_filepath)
         self.copy_to_clipboard(None, [abs_path])
 
     def prepend_selection(self):
-        try:
-            user32.keybd_event(0x11, 0, 0, 0)
-            user32.keybd_event(0x43, 0, 0, 0)
-            time.sleep(0.05)
-            user32.keybd_event(0x43, 0, win32con.KEYEVENTF_KEYUP, 0)
-            user32.keybd_event(0x11, 0, win32con.KEYEVENTF_KEYUP, 0)
-            time.sleep(0.15)
-        except Exception:
-            pass
+        # Send Ctrl+C only when talking to the real clipboard
+        if self.clipboard is win32clipboard:
+            try:
+                user32.keybd_event(0x11, 0, 0, 0)
+                user32.keybd_event(0x43, 0, 0, 0)
+                time.sleep(0.05)
+                user32.keybd_event(0x43, 0, win32con.KEYEVENTF_KEYUP, 0)
+                user32.keybd_event(0x11, 0, win32con.KEYEVENTF_KEYUP, 0)
+                time.sleep(0.15)
+            except Exception:
+                pass
         text = None
         file_paths = None
         try:
-            win32clipboard.OpenClipboard()
+            self.clipboard.OpenClipboard()
             try:
-                if win32clipboard.IsClipboardFormatAvailable(win32con.CF_HDROP):
+                if self.clipboard.IsClipboardFormatAvailable(self.clipboard.CF_HDROP):
                     try:
-                        file_paths = list(win32clipboard.GetClipboardData(win32con.CF_HDROP))
+                        file_paths = list(self.clipboard.GetClipboardData(self.clipboard.CF_HDROP))
                     except Exception:
                         file_paths = None
                 if not file_paths:
-                    if win32clipboard.IsClipboardFormatAvailable(win32clipboard.CF_UNICODETEXT):
-                        text = win32clipboard.GetClipboardData(win32clipboard.CF_UNICODETEXT)
-                    elif win32clipboard.IsClipboardFormatAvailable(win32clipboard.CF_TEXT):
-                        raw = win32clipboard.GetClipboardData(win32clipboard.CF_TEXT)
+                    if self.clipboard.IsClipboardFormatAvailable(self.clipboard.CF_UNICODETEXT):
+                        text = self.clipboard.GetClipboardData(self.clipboard.CF_UNICODETEXT)
+                    elif self.clipboard.IsClipboardFormatAvailable(self.clipboard.CF_TEXT):
+                        raw = self.clipboard.GetClipboardData(self.clipboard.CF_TEXT)
                         try:
                             text = raw.decode("utf-8", errors="ignore")
                         except AttributeError:
                             text = raw
             finally:
                 try:
-                    win32clipboard.CloseClipboard()
+                    self.clipboard.CloseClipboard()
                 except Exception:
                     pass
         except Exception:
@@ -655,6 +1415,7 @@ class ScreenshotSession:
                         n += 1
                     try:
                         shutil.copyfile(src, target)
+                        self._track_folder_file(target, os.path.getsize(target))
                     except Exception:
                         continue
                 self.gui_queue.put(("COPIED",))
@@ -677,23 +1438,24 @@ class ScreenshotSession:
             try:
                 with open(save_path, "w", encoding="utf-8") as f:
                     f.write(str(text) + ("\n" + prefix if prefix else ""))
+                self._track_folder_file(save_path, os.path.getsize(save_path))
             except Exception:
                 pass
             self.gui_queue.put(("COPIED",))
             return
 
         if text:
-            if not self.document:
+            if not self.writer:
                 try:
-                    self.document = Document(self.current_filepath)
+                    self.writer = DocxWriter(self.current_filepath)
                 except Exception:
-                    self.document = Document()
+                    self.writer = DocxWriter.create(self.current_filepath)
             try:
-                body = self.document._body._element
-                p = self.document.add_paragraph(str(text))
-                body.insert(0, p._element)
-                self.document.save(self.current_filepath)
-                self.last_size_str = self._get_file_size(self.current_filepath)
+                # Inserting at the top shifts every block, so no capture may be staging meanwhile
+                with self.commit_lock:
+                    self.writer.add_paragraph(str(text), index=0)
+                    self._commit_writer()
+                self.last_size_str = self._format_size(self.writer.size)
                 self.gui_queue.put(("COPIED",))
             except Exception:
                 pass
@@ -0,0 +1,102 @@
+import io
+import os
+import threading
+import uuid
+from typing import Optional
+
+from PIL import Image
+
+
+class PendingFrame:
+    """
+    A captured frame waiting to be saved or copied.
+    The pixels are held raw, as a lossless PNG in memory, or spilled to disk.
+    """
+
+    def __init__(self, image: Image.Image, consumers: int = 1):
+        self.size = image.size
+        self.mode = image.mode
+        self.image: Optional[Image.Image] = image
+        self.data: Optional[bytes] = None
+        self.path: Optional[str] = None
+        self.consumers = consumers
+        self.spilled_bytes = 0
+        self.held_bytes = len(image.getbands()) * image.size[0] * image.size[1]
+
+    def compact(self):
+        """Replaces the raw pixels with a fast lossless PNG."""
+        if self.image is None:
+            return
+        buffer = io.BytesIO()
+        self.image.save(buffer, "PNG", compress_level=1)
+        self.data = buffer.getvalue()
+        self.image = None
+        self.held_bytes = len(self.data)
+
+    def spill(self, directory: str):
+        """Moves the frame out of memory into directory."""
+        if self.data is None:
+            self.compact()
+        self.path = os.path.join(directory, f"pending_{uuid.uuid4().hex}.png")
+        with open(self.path, "wb") as f:
+            f.write(self.data)
+        self.spilled_bytes = len(self.data)
+        self.data = None
+        self.held_bytes = 0
+
+    def load(self) -> Image.Image:
+        if self.image is not None:
+            return self.image
+        source = io.BytesIO(self.data) if self.data is not None else self.path
+        with Image.open(source) as img:
+            img.load()
+            return img.copy()
+
+    def discard(self):
+        self.image = None
+        self.data = None
+        self.held_bytes = 0
+        if self.path:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+
+class FrameBudget:
+    """
+    Bounds the memory held by a session's pending frames.
+    Frames admitted past the budget are compacted, then spilled to disk.
+    """
+
+    def __init__(self, limit_bytes: int, spill_dir: str):
+        self.limit_bytes = limit_bytes
+        self.spill_dir = spill_dir
+        self.depth = 0
+        self.bytes_held = 0
+        self.bytes_spilled = 0
+        self._lock = threading.Lock()
+
+    def admit(self, frame: PendingFrame):
+        # Compaction runs on the capturing thread, which is the backpressure
+        if self.limit_bytes > 0 and self.bytes_held + frame.held_bytes > self.limit_bytes:
+            frame.compact()
+            if self.bytes_held + frame.held_bytes > self.limit_bytes:
+                frame.spill(self.spill_dir)
+
+        with self._lock:
+            self.depth += 1
+            self.bytes_held += frame.held_bytes
+            self.bytes_spilled += frame.spilled_bytes
+
+    def release(self, frame: PendingFrame):
+        """Called by each consumer; the frame is freed once all are done."""
+        with self._lock:
+            frame.consumers -= 1
+            if frame.consumers > 0:
+                return
+            self.depth -= 1
+            self.bytes_held -= frame.held_bytes
+            self.bytes_spilled -= frame.spilled_bytes
+        frame.discard()
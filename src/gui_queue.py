@@ -0,0 +1,81 @@
+import queue
+import threading
+from typing import Callable, List, Optional, Tuple
+
+# Status messages where only the newest one per session matters; a drain keeps the last of each
+COALESCED = frozenset({"NOTIFY", "UPDATE_SESSION", "UNDO", "REDO", "QUEUE", "METRICS"})
+# Progress messages that have no session; the newest one replaces the rest
+COALESCED_GLOBAL = frozenset({"COPY_PROGRESS"})
+
+
+class GuiQueue(queue.Queue):
+    """
+    Queue from the worker threads to the Tk thread that wakes the GUI only
+    when there is something to handle, instead of the GUI polling it.
+
+    The first put after a drain asks for a wakeup; later puts ride on it
+    until the GUI drains again, so a burst costs one wakeup.
+
+    wake() runs on a thread of its own. Tkinter makes a call from another
+    thread wait until the Tk thread has run it, and a worker that waited
+    there while holding a session lock the GUI also needs would deadlock.
+    Set wake to None before the GUI loop stops.
+    """
+
+    def __init__(self, wake: Optional[Callable[[], None]] = None):
+        super().__init__()
+        self.wake = wake
+        self._wake_lock = threading.Lock()
+        self._wake_pending = False
+        self._wake_requested = threading.Event()
+        threading.Thread(target=self._wake_loop, daemon=True).start()
+
+    def put(self, item, block=True, timeout=None):
+        super().put(item, block, timeout)
+        with self._wake_lock:
+            if self._wake_pending or self.wake is None:
+                return
+            self._wake_pending = True
+        self._wake_requested.set()
+
+    def _wake_loop(self):
+        while True:
+            self._wake_requested.wait()
+            self._wake_requested.clear()
+            wake = self.wake
+            try:
+                if wake is None:
+                    raise RuntimeError("No GUI to wake")
+                wake()
+            except Exception:
+                # The GUI loop is not running (yet, or any more); the next drain picks the message up
+                with self._wake_lock:
+                    self._wake_pending = False
+
+    def drain(self) -> List[Tuple]:
+        """
+        Every queued message, with status messages collapsed to the newest
+        per session and kind. Messages keep the order of their last arrival.
+        """
+        with self._wake_lock:
+            self._wake_pending = False
+
+        messages = []
+        latest = {}
+        while True:
+            try:
+                msg = self.get_nowait()
+            except queue.Empty:
+                break
+            if msg[0] in COALESCED:
+                key = (msg[0], msg[1])
+            elif msg[0] in COALESCED_GLOBAL:
+                key = (msg[0],)
+            else:
+                key = None
+            if key is not None:
+                if key in latest:
+                    messages[latest[key]] = None
+                latest[key] = len(messages)
+            messages.append(msg)
+        return [msg for msg in messages if msg is not None]
@@ -1,16 +1,19 @@
 import ctypes
 import threading
+import time
 from ctypes import wintypes
 from typing import Callable, Optional
 
 MOD_ALT = 0x0001
 MOD_CONTROL = 0x0002
+MOD_SHIFT = 0x0004
 WM_HOTKEY = 0x0312
 WM_USER = 0x0400
 WM_STOP_LISTENER = WM_USER + 1
 
-kernel32 = ctypes.windll.kernel32
-user32 = ctypes.windll.user32
+# None off Windows, so modules that share these handles can still be imported
+kernel32 = ctypes.windll.kernel32 if hasattr(ctypes, "windll") else None
+user32 = ctypes.windll.user32 if hasattr(ctypes, "windll") else None
 
 
 class HotkeyListener:
@@ -20,14 +23,18 @@ class HotkeyListener:
         on_undo: Callable,
         on_prepend: Optional[Callable] = None,
         on_error: Optional[Callable] = None,
+        on_redo: Optional[Callable] = None,
     ):
         self.on_capture = on_capture
         self.on_undo = on_undo
         self.on_prepend = on_prepend
         self.on_error = on_error
+        self.on_redo = on_redo
         self.thread: Optional[threading.Thread] = None
         self.thread_id: Optional[int] = None
         self.is_running = False
+        # perf_counter() time at which the last hotkey message was posted
+        self.last_hotkey_at: Optional[float] = None
 
     def start(self) -> None:
         if self.thread is None or not self.thread.is_alive():
@@ -54,16 +61,25 @@ class HotkeyListener:
         if not user32.RegisterHotKey(None, 3, MOD_CONTROL, vk_tilde):
             if self.on_error:
                 self.on_error("Prepend (Ctrl+~)")
+        if self.on_redo and not user32.RegisterHotKey(None, 4, MOD_CONTROL | MOD_SHIFT, vk_tilde):
+            if self.on_error:
+                self.on_error("Redo (Ctrl+Shift+~)")
 
         msg = wintypes.MSG()
         while user32.GetMessageW(ctypes.byref(msg), None, 0, 0) != 0:
             if msg.message == WM_HOTKEY:
+                # msg.time is the tick count when the message was posted, so
+                # time spent waiting in the message queue is counted too
+                queued_ms = (kernel32.GetTickCount() - msg.time) & 0xFFFFFFFF
+                self.last_hotkey_at = time.perf_counter() - min(queued_ms, 10000) / 1000
                 if msg.wParam == 1 and self.on_capture:
                     self.on_capture()
                 elif msg.wParam == 2 and self.on_undo:
                     self.on_undo()
                 elif msg.wParam == 3 and self.on_prepend:
                     self.on_prepend()
+                elif msg.wParam == 4 and self.on_redo:
+                    self.on_redo()
             elif msg.message == WM_STOP_LISTENER:
                 break
 
@@ -73,3 +89,4 @@ class HotkeyListener:
         user32.UnregisterHotKey(None, 1)
         user32.UnregisterHotKey(None, 2)
         user32.UnregisterHotKey(None, 3)
+        user32.UnregisterHotKey(None, 4)
@@ -0,0 +1,173 @@
+import json
+import os
+import struct
+import threading
+import uuid
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+MAGIC = b"CLICKJ1\n"
+# Record header: metadata length, data length, CRC-32 of both
+RECORD_HEADER = struct.Struct("<III")
+
+JOURNAL_SUFFIX = ".journal"
+# Added while a journal is being replayed; one left behind is picked up again
+RECOVERING_SUFFIX = JOURNAL_SUFFIX + ".recovering"
+
+
+def default_journal_dir() -> str:
+    """Per-user folder for session journals; outside the temp folders cleared at startup."""
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".click")
+    return os.path.join(base, "Click", "journal")
+
+
+class CaptureJournal:
+    """
+    Append-only write-ahead log for a DOCX session.
+
+    Every capture is appended, encoded bytes and all, as soon as it has been
+    encoded, in the order the captures, undos and redos happened; each record
+    carries that event's sequence number. A checkpoint after each commit
+    appends a small marker with the newest sequence number the document
+    holds, and a rotation one with the new part, so a checkpoint never
+    copies records. Once the document holds everything, the journal is cut
+    back to its header. A clean close deletes it; one left behind after a
+    crash is replayed by recover_journal() on the next start.
+    """
+
+    def __init__(self, directory: str, document: str, sync: bool = False):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, uuid.uuid4().hex + JOURNAL_SUFFIX)
+        self.document = document
+        # Sequence number and file offset of each record not committed yet
+        self.records: List[Tuple[int, int]] = []
+        # Newest sequence number the document holds; older events are not journaled again
+        self.committed = 0
+        # Flush every record to disk, not just to the OS
+        self.sync = sync
+        self._lock = threading.Lock()
+        self._file = open(self.path, "w+b")
+        self._header_size = 0
+        self._header_document = None
+        self._write_header()
+
+    def _write_header(self):
+        self._file.seek(0)
+        self._file.write(MAGIC + _record({"k": "document", "path": self.document}))
+        self._header_size = self._file.tell()
+        self._header_document = self.document
+        self._file.truncate()
+        self._flush()
+
+    def append(self, kind: str, seq: int, meta: Optional[Dict] = None, data: bytes = b""):
+        """Records event seq; events must be appended in sequence order."""
+        with self._lock:
+            if self._file.closed or seq <= self.committed:
+                return
+            self._file.seek(0, os.SEEK_END)
+            self.records.append((seq, self._file.tell()))
+            self._file.write(_record(dict(meta or {}, k=kind, seq=seq), data))
+            self._flush()
+
+    def checkpoint(self, document: Optional[str] = None, through: Optional[int] = None):
+        """
+        The document holds every event up to sequence number through; those
+        records no longer count. document switches the journal to a new part,
+        which the records still pending belong to.
+        """
+        with self._lock:
+            if self._file.closed:
+                return
+            committed = self.committed
+            if through is not None:
+                self.committed = max(self.committed, through)
+            self.records = [(seq, offset) for seq, offset in self.records if seq > self.committed]
+            switched = bool(document) and document != self.document
+            if switched:
+                self.document = document
+            if not self.records:
+                # Nothing pending: a header for the current part is all that is left
+                if self._header_document != self.document:
+                    self._write_header()
+                elif self._file.seek(0, os.SEEK_END) > self._header_size:
+                    self._file.truncate(self._header_size)
+                    self._flush()
+                return
+            self._file.seek(0, os.SEEK_END)
+            if self.committed > committed:
+                self._file.write(_record({"k": "checkpoint", "seq": self.committed}))
+            if switched:
+                self._file.write(_record({"k": "document", "path": document}))
+            self._flush()
+
+    def _flush(self):
+        self._file.flush()
+        if self.sync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        """Closes and deletes the journal; only call once the document holds every capture."""
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.close()
+            try:
+                os.remove(self.path)
+            except OSError as e:
+                print(f"Journal Error: {e}")
+
+
+def _record(meta: Dict, data: bytes = b"") -> bytes:
+    encoded = json.dumps(meta).encode("utf-8")
+    return RECORD_HEADER.pack(len(encoded), len(data), zlib.crc32(data, zlib.crc32(encoded))) + encoded + data
+
+
+def read_journal(path: str) -> Tuple[Optional[str], List[Tuple[Dict, bytes]]]:
+    """
+    Target document and the records it does not hold yet. Reading stops at
+    the first torn or corrupt record, which is where the process died.
+    """
+    with open(path, "rb") as f:
+        content = f.read()
+    if not content.startswith(MAGIC):
+        return None, []
+
+    offset = len(MAGIC)
+    records = []
+    while offset + RECORD_HEADER.size <= len(content):
+        meta_len, data_len, crc = RECORD_HEADER.unpack_from(content, offset)
+        start = offset + RECORD_HEADER.size
+        end = start + meta_len + data_len
+        if end > len(content):
+            break
+        encoded = content[start:start + meta_len]
+        data = content[start + meta_len:end]
+        if zlib.crc32(data, zlib.crc32(encoded)) != crc:
+            break
+        try:
+            records.append((json.loads(encoded), data))
+        except ValueError:
+            break
+        offset = end
+
+    if not records or records[0][0].get("k") != "document":
+        return None, []
+    document = None
+    committed = 0
+    for meta, _ in records:
+        if meta.get("k") == "document":
+            document = meta.get("path")
+        elif meta.get("k") == "checkpoint":
+            committed = max(committed, meta.get("seq", 0))
+    return document, [(meta, data) for meta, data in records
+                      if meta.get("k") not in ("document", "checkpoint") and meta.get("seq", 0) > committed]
+
+
+def find_journals(directory: str) -> List[str]:
+    """Journals left behind by sessions that did not close cleanly, oldest first."""
+    try:
+        names = [n for n in os.listdir(directory) if n.endswith((JOURNAL_SUFFIX, RECOVERING_SUFFIX))]
+    except OSError:
+        return []
+    paths = [os.path.join(directory, n) for n in names]
+    return sorted(paths, key=lambda p: os.path.getmtime(p))
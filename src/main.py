@@ -6,12 +6,12 @@ import datetime
 import threading
 import tempfile
 import shutil
-import queue
+import time
 import re
 import sys
 import json
+import multiprocessing
 from typing import Dict, Optional
-from docx import Document
 
 import sys
 import os
@@ -24,7 +24,12 @@ if project_root not in sys.path:
 
 from src.utils import get_resource_path, set_dpi_awareness
 from src.hotkeys import HotkeyListener
-from src.engine import ScreenshotSession
+from src.engine import DEFAULT_GROUP_COMMIT_MS, ScreenshotSession, recover_journal
+from src.docx_writer import count_pictures, read_summary, restore_interrupted_commit
+from src.encoding import shutdown_encoder_pool
+from src.journal import default_journal_dir, find_journals
+from src.gui_queue import GuiQueue
+from src.workers import shutdown_session_executor
 
 
 class ToonConfig:
@@ -125,6 +130,9 @@ class AutoScrollFrame(ctk.CTkFrame):
         self.canvas.update_idletasks()
 
 
+# Minimum seconds between notification pop-ups
+NOTIFICATION_INTERVAL = 0.25
+
 # Enable High-DPI support
 set_dpi_awareness()
 
@@ -137,11 +145,16 @@ class ModernUI(ctk.CTk):
         ctk.set_appearance_mode("Dark")
         ctk.set_default_color_theme("dark-blue")
 
-        self.gui_queue = queue.Queue()
+        # Wakes the Tk loop through a virtual event when a message is queued
+        self.gui_queue = GuiQueue(lambda: self.event_generate("<<GuiMessage>>", when="tail"))
         self.active_sessions = {}
         self.current_session_key = None
         self.backup_path = None
         self.notification_timer = None
+        # Pop-ups are rate limited; the newest one waiting is shown when the interval is up
+        self.notification_shown_at = 0.0
+        self.pending_notification = None
+        self.notification_flush = None
         self.config_file = "config.toon"
 
         self._cleanup_temp_files()
@@ -375,9 +388,15 @@ class ModernUI(ctk.CTk):
         self.status_label = ctk.CTkLabel(content_parent, text="Ready to capture",
                                          text_color=self.colors["text_secondary"])
         self.status_label.grid(row=6, column=0, pady=(20, 0))
-        ctk.CTkLabel(content_parent, text="~ (Capture)    |    Ctrl+Alt+~ (Undo)    |    Ctrl+~ (Prepend Selection)",
+        ctk.CTkLabel(content_parent, text="~ (Capture)    |    Ctrl+Alt+~ (Undo)    |    Ctrl+Shift+~ (Redo)    |    Ctrl+~ (Prepend Selection)",
                      text_color=self.colors["text_secondary"],
                      font=ctk.CTkFont(size=11)).grid(row=7, column=0)
+        self.queue_label = ctk.CTkLabel(content_parent, text="", text_color=self.colors["text_secondary"],
+                                        font=ctk.CTkFont(size=11))
+        self.queue_label.grid(row=8, column=0)
+        self.metrics_label = ctk.CTkLabel(content_parent, text="", text_color=self.colors["text_secondary"],
+                                          font=ctk.CTkFont(size=11))
+        self.metrics_label.grid(row=9, column=0)
 
         # Notification Popup
         self.notification_window = ctk.CTkToplevel(self)
@@ -408,10 +427,17 @@ class ModernUI(ctk.CTk):
         self.after(200, self._apply_window_icon)
 
         self.hotkey_manager = HotkeyListener(self.on_hotkey_capture, self.on_hotkey_undo, self.on_hotkey_prepend,
-                                             self.on_hotkey_error)
+                                             self.on_hotkey_error, self.on_hotkey_redo)
         self.hotkey_manager.start()
 
-        self.check_message_queue()
+        # Captures journaled by a session that never closed cleanly; no session
+        # may open a document until they are back in it
+        self.recovery_done = threading.Event()
+        threading.Thread(target=self._recover_journals, daemon=True).start()
+
+        self.bind("<<GuiMessage>>", self.check_message_queue)
+        # Messages queued before the main loop started could not wake it
+        self.after_idle(self.check_message_queue)
         self.protocol("WM_DELETE_WINDOW", self.on_close)
 
         # Splash Screen Handling
@@ -538,6 +564,22 @@ class ModernUI(ctk.CTk):
         self.gui_queue.put(("HOTKEY_FAIL", key_name))
 
     def show_notification(self, title, message):
+        self.pending_notification = (title, message)
+        wait = self.notification_shown_at + NOTIFICATION_INTERVAL - time.monotonic()
+        if wait > 0:
+            if self.notification_flush is None:
+                self.notification_flush = self.after(int(wait * 1000) + 1, self._show_pending_notification)
+            return
+        self._show_pending_notification()
+
+    def _show_pending_notification(self):
+        self.notification_flush = None
+        if self.pending_notification is None:
+            return
+        title, message = self.pending_notification
+        self.pending_notification = None
+        self.notification_shown_at = time.monotonic()
+
         self.notif_label.configure(text=f"{title}\n{message}", text_color=self.colors['success'])
         self.notification_window.update_idletasks()
 
@@ -561,46 +603,106 @@ class ModernUI(ctk.CTk):
             if self.var_save_date.get():
                 self.update_path_preview()
 
+    def _recovering(self):
+        """True, with a message, while startup recovery may still be writing a document."""
+        if self.recovery_done.is_set():
+            return False
+        self.status_label.configure(text="Recovering captures from the last session...", text_color="orange")
+        return True
+
     def select_existing_word_file(self):
+        if self._recovering():
+            return
         file_path = filedialog.askopenfilename(title="Select Word Document to Append",
                                                filetypes=[("Word documents", "*.docx")])
         if file_path:
-            from docx import Document
-            size_bytes = os.path.getsize(file_path)
-            size_str = f"{size_bytes / 1024:.2f} KB" if size_bytes < 1048576 else f"{size_bytes / 1048576:.2f} MB"
-            doc = Document(file_path)
-            img_count = len(doc.inline_shapes)
-
-            # If a session for this file already exists, just activate it
-            if file_path in self.active_sessions:
-                self.current_session_key = file_path
-                if not self.session_tree.exists(file_path):
-                    self.session_tree.insert("", "end", iid=file_path, text=os.path.basename(file_path),
-                                             values=("Active", img_count))
-                else:
-                    self.session_tree.item(file_path, values=("Active", img_count))
-                self.session_tree.selection_set(file_path)
-                self.update_status_label()
-                self.status_label.configure(text=f"Resumed: {img_count} images ({size_str})",
-                                            text_color=self.colors["accent"])
+            key = self._session_for_document(file_path)
+            if key is not None:
+                # Its writer owns the file; the session is only brought to the front
+                self.resume_word_file(key, self.active_sessions[key].screenshot_count)
                 return
+            try:
+                restore_interrupted_commit(file_path)
+            except OSError as e:
+                print(f"Restore Error: {e}")
+            summary = read_summary(file_path)
+            if summary is not None:
+                self.resume_word_file(file_path, summary[0])
+            else:
+                # No cached count: stream the body off the GUI thread
+                self.status_label.configure(text="Reading document...", text_color="orange")
+                threading.Thread(target=self._count_word_file, args=(file_path,), daemon=True).start()
+
+    def _session_for_document(self, file_path):
+        """Key of the open session writing file_path, if any."""
+        wanted = os.path.normcase(os.path.abspath(file_path))
+        for key, session in self.active_sessions.items():
+            writer = session.writer
+            paths = [key, session.current_filepath, writer.path if writer else None]
+            if any(os.path.normcase(os.path.abspath(p)) == wanted for p in paths if p):
+                return key
+        return None
+
+    def _count_word_file(self, file_path):
+        try:
+            img_count = count_pictures(file_path)
+        except Exception as e:
+            print(f"Resume Count Error: {e}")
+            img_count = None
+        self.gui_queue.put(("RESUME_COUNT", file_path, img_count))
+
+    def _recover_journals(self):
+        journal_dir = self.app_config.get("journal_dir") or default_journal_dir()
+        try:
+            for path in find_journals(journal_dir):
+                try:
+                    document, count = recover_journal(path)
+                except Exception as e:
+                    print(f"Recovery Error: {e}")
+                    continue
+                if document and count:
+                    self.gui_queue.put(("RECOVERED", document, count))
+        finally:
+            self.recovery_done.set()
+            self.gui_queue.put(("RECOVERY_DONE",))
+
+    def resume_word_file(self, file_path, img_count):
+        if img_count is None:
+            self.status_label.configure(text="Could not read document", text_color="red")
+            return
+        size_bytes = os.path.getsize(file_path)
+        size_str = f"{size_bytes / 1024:.2f} KB" if size_bytes < 1048576 else f"{size_bytes / 1048576:.2f} MB"
+
+        # If a session for this file already exists, just activate it
+        if file_path in self.active_sessions:
+            self.current_session_key = file_path
+            if not self.session_tree.exists(file_path):
+                self.session_tree.insert("", "end", iid=file_path, text=os.path.basename(file_path),
+                                         values=("Active", img_count))
+            else:
+                self.session_tree.item(file_path, values=("Active", img_count))
+            self.session_tree.selection_set(file_path)
+            self.update_status_label()
+            self.status_label.configure(text=f"Resumed: {img_count} images ({size_str})",
+                                        text_color=self.colors["accent"])
+            return
 
-            self.entry_path.delete(0, "end")
-            self.entry_path.insert(0, os.path.normpath(os.path.dirname(file_path)))
-            name_only = os.path.basename(file_path).replace(".docx", "")
-            self.entry_name.delete(0, "end")
-            self.entry_name.insert(0, name_only)
-            self.combo_mode.set("Word Document")
+        self.entry_path.delete(0, "end")
+        self.entry_path.insert(0, os.path.normpath(os.path.dirname(file_path)))
+        name_only = os.path.basename(file_path).replace(".docx", "")
+        self.entry_name.delete(0, "end")
+        self.entry_name.insert(0, name_only)
+        self.combo_mode.set("Word Document")
 
-            self.status_label.configure(text=f"Ready to Resume: {img_count} images ({size_str})",
-                                        text_color=self.colors["accent"])
+        self.status_label.configure(text=f"Ready to Resume: {img_count} images ({size_str})",
+                                    text_color=self.colors["accent"])
 
-            # This is the critical hand-off data
-            self.app_config["target_file"] = file_path
-            self.app_config["start_count"] = img_count
+        # This is the critical hand-off data
+        self.app_config["target_file"] = file_path
+        self.app_config["start_count"] = img_count
 
-            # Automatically start the session for the selected file
-            self.start_new_session()
+        # Automatically start the session for the selected file
+        self.start_new_session()
 
     def load_defaults(self):
         config = self.app_config
@@ -643,7 +745,26 @@ class ModernUI(ctk.CTk):
             "append_num": self.var_append_num.get(),
             "auto_copy": self.var_auto_copy.get(),
             "copy_files": self.var_copy_files.get(),
-            "copy_image": self.var_copy_img.get()
+            "copy_image": self.var_copy_img.get(),
+            "group_commit": self.app_config.get("group_commit", True),
+            "group_commit_ms": self.app_config.get("group_commit_ms", DEFAULT_GROUP_COMMIT_MS),
+            "max_pending_mb": self.app_config.get("max_pending_mb", 512),
+            "parallel_encode": self.app_config.get("parallel_encode", False),
+            "folder_reconcile_s": self.app_config.get("folder_reconcile_s", 60),
+            "dedupe_mode": self.app_config.get("dedupe_mode", "off"),
+            "dedupe_threshold": self.app_config.get("dedupe_threshold", 2),
+            "metrics_file": self.app_config.get("metrics_file", ""),
+            "capture_backend": self.app_config.get("capture_backend", "pil"),
+            "capture_mode": self.app_config.get("capture_mode", "all_screens"),
+            "capture_region": self.app_config.get("capture_region", ""),
+            "docx_dpi": self.app_config.get("docx_dpi", 0),
+            "image_format": self.app_config.get("image_format", "jpeg"),
+            "format_budget_ms": self.app_config.get("format_budget_ms", 40),
+            "undo_levels": self.app_config.get("undo_levels", 100),
+            "compact_docx": self.app_config.get("compact_docx", True),
+            "journal": self.app_config.get("journal", True),
+            "journal_dir": self.app_config.get("journal_dir", ""),
+            "fsync": self.app_config.get("fsync", "rotation")
         }
         ToonConfig.save(self.config_file, data)
 
@@ -673,6 +794,8 @@ class ModernUI(ctk.CTk):
             self.entry_path.delete(0, "end")
             self.entry_path.insert(0, os.path.normpath(final_dir))
             return
+        if self._recovering():
+            return
 
         self.entry_path.delete(0, "end")
         self.entry_path.insert(0, os.path.normpath(final_dir))
@@ -696,7 +819,26 @@ class ModernUI(ctk.CTk):
             "auto_copy": self.var_auto_copy.get(),
             "copy_files": self.var_copy_files.get(),
             "copy_image": self.var_copy_img.get(),
-            "max_size": self.entry_size.get().strip()
+            "max_size": self.entry_size.get().strip(),
+            "group_commit": self.app_config.get("group_commit", True),
+            "group_commit_ms": self.app_config.get("group_commit_ms", DEFAULT_GROUP_COMMIT_MS),
+            "max_pending_mb": self.app_config.get("max_pending_mb", 512),
+            "parallel_encode": self.app_config.get("parallel_encode", False),
+            "folder_reconcile_s": self.app_config.get("folder_reconcile_s", 60),
+            "dedupe_mode": self.app_config.get("dedupe_mode", "off"),
+            "dedupe_threshold": self.app_config.get("dedupe_threshold", 2),
+            "metrics_file": self.app_config.get("metrics_file", ""),
+            "capture_backend": self.app_config.get("capture_backend", "pil"),
+            "capture_mode": self.app_config.get("capture_mode", "all_screens"),
+            "capture_region": self.app_config.get("capture_region", ""),
+            "docx_dpi": self.app_config.get("docx_dpi", 0),
+            "image_format": self.app_config.get("image_format", "jpeg"),
+            "format_budget_ms": self.app_config.get("format_budget_ms", 40),
+            "undo_levels": self.app_config.get("undo_levels", 100),
+            "compact_docx": self.app_config.get("compact_docx", True),
+            "journal": self.app_config.get("journal", True),
+            "journal_dir": self.app_config.get("journal_dir", ""),
+            "fsync": self.app_config.get("fsync", "rotation")
         }
 
         session = ScreenshotSession(config, self.gui_queue)
@@ -827,14 +969,37 @@ class ModernUI(ctk.CTk):
             name = os.path.basename(self.current_session_key)
             self.status_label.configure(text=f"ACTIVE: {name}", text_color=self.colors["accent"])
 
+    def update_queue_label(self, depth, bytes_held, bytes_spilled):
+        if depth <= 0:
+            self.queue_label.configure(text="")
+            return
+        text = f"Pending: {depth} frame{'s' if depth != 1 else ''} ({bytes_held / 1048576:.1f} MB in memory"
+        if bytes_spilled:
+            text += f", {bytes_spilled / 1048576:.1f} MB on disk"
+        self.queue_label.configure(text=text + ")", text_color="orange")
+
+    def update_metrics_label(self, summary):
+        # Capture-to-notification latency plus the stages that usually dominate it
+        parts = []
+        for stage in ("total", "grab", "encode", "save"):
+            if stage in summary:
+                p50, p95, p99 = summary[stage]
+                parts.append(f"{stage} {p50:.0f}/{p95:.0f}/{p99:.0f}")
+        text = "Latency ms p50/p95/p99: " + "  |  ".join(parts) if parts else ""
+        self.metrics_label.configure(text=text)
+
     def on_hotkey_capture(self):
         if self.current_session_key:
-            self.active_sessions[self.current_session_key].capture()
+            self.active_sessions[self.current_session_key].capture(hotkey_at=self.hotkey_manager.last_hotkey_at)
 
     def on_hotkey_undo(self):
         if self.current_session_key:
             self.active_sessions[self.current_session_key].undo()
 
+    def on_hotkey_redo(self):
+        if self.current_session_key:
+            self.active_sessions[self.current_session_key].redo()
+
     def on_hotkey_prepend(self):
         if self.current_session_key:
             self.active_sessions[self.current_session_key].prepend_selection()
@@ -849,84 +1014,120 @@ class ModernUI(ctk.CTk):
             self.show_notification("Copied All",
                                    f"{len(self.active_sessions[self.current_session_key].captured_images)} Images")
 
-    def check_message_queue(self):
-        try:
-            while True:
-                msg = self.gui_queue.get_nowait()
-                action = msg[0]
-
-                if action == "NOTIFY":
-                    if msg[1] in self.active_sessions:
-                        self.session_tree.set(msg[1], "count", msg[2])
-                        if msg[1] == self.current_session_key:
-                            self.status_label.configure(text=f"Captured #{msg[2]} ({msg[3]})",
-                                                        text_color=self.colors["success"])
-                            self.show_notification(f"Screenshot #{msg[2]}", msg[3])
-
-                elif action == "UPDATE_SESSION":
-                    if msg[1] in self.active_sessions:
-                        self.session_tree.set(msg[1], "count", msg[2])
-                        if msg[1] == self.current_session_key:
-                            self.status_label.configure(text=f"Saved #{msg[2]} ({msg[3]})",
-                                                        text_color=self.colors["success"])
-                            self.show_notification(f"Screenshot #{msg[2]}", msg[3])
-
-                elif action == "UNDO":
-                    if msg[1] in self.active_sessions:
-                        self.session_tree.set(msg[1], "count", msg[2])
-                        if msg[1] == self.current_session_key:
-                            self.status_label.configure(text=f"Undone (#{msg[2]})", text_color="orange")
-                            self.show_notification(f"Undone #{msg[2]}", msg[3])
-
-                elif action == "WARNING":
-                    messagebox.showwarning(msg[1], msg[2])
-
-                elif action == "HOTKEY_FAIL":
-                    messagebox.showerror("Hotkey Error",
-                                         f"Could not register: {msg[1]}\nClose other apps using this key.")
-
-                elif action == "COPY_PROGRESS":
-                    # msg[1] = current, msg[2] = total
-                    self.status_label.configure(text=f"Copying to Clipboard... ({msg[1]}/{msg[2]})",
-                                                text_color="orange")
-                    if msg[1] == msg[2]:
-                        self.show_notification("Copied!", "")
-                        self.update_status_label()
-
-                elif action == "UPDATE_FILENAME":
-                    # msg[1] = session_id, msg[2] = new_filepath
-                    session_key = msg[1]
-                    new_path = msg[2]
-                    if session_key in self.active_sessions:
-                        base = os.path.basename(new_path)
-                        match = re.search(r"_Part(\d+)\.docx$", base)
-                        if match:
-                            part_num = match.group(1)
-                            # Update tree item text
-                            orig_name = os.path.basename(session_key)
-                            # Remove extension from original name if present for display
-                            if orig_name.lower().endswith('.docx'):
-                                orig_name = orig_name[:-5]
-
-                            display_name = f"{orig_name} (Part {part_num})"
-                            self.session_tree.item(session_key, text=display_name)
-
-                            # Update status label if this is the current session
-                            if session_key == self.current_session_key:
-                                self.status_label.configure(text=f"Switched to Part {part_num}",
-                                                            text_color=self.colors["accent"])
-
-                elif action == "COPIED":
-                    self.show_notification("Copied!", "")
-                elif action == "COPY_FILES_NOT_SUPPORTED":
-                    self.show_notification("Files cannot be copied", "Only text can be copied")
-                elif action == "CLIPBOARD_ERROR":
-                    messagebox.showerror("Clipboard Error",
-                                         "Could not access the clipboard.\nPlease close other apps that might be locking it and try again.")
-
-        except queue.Empty:
-            pass
-        self.after(20, self.check_message_queue)
+    def check_message_queue(self, event=None):
+        # Runs only when a worker has queued something; see GuiQueue
+        for msg in self.gui_queue.drain():
+            self.handle_gui_message(msg)
+
+    def handle_gui_message(self, msg):
+        action = msg[0]
+
+        if action == "NOTIFY":
+            if msg[1] in self.active_sessions:
+                self.session_tree.set(msg[1], "count", msg[2])
+                if msg[1] == self.current_session_key:
+                    self.status_label.configure(text=f"Captured #{msg[2]} ({msg[3]})",
+                                                text_color=self.colors["success"])
+                    self.show_notification(f"Screenshot #{msg[2]}", msg[3])
+
+        elif action == "UPDATE_SESSION":
+            if msg[1] in self.active_sessions:
+                self.session_tree.set(msg[1], "count", msg[2])
+                if msg[1] == self.current_session_key:
+                    self.status_label.configure(text=f"Saved #{msg[2]} ({msg[3]})",
+                                                text_color=self.colors["success"])
+                    self.show_notification(f"Screenshot #{msg[2]}", msg[3])
+
+        elif action == "UNDO":
+            if msg[1] in self.active_sessions:
+                self.session_tree.set(msg[1], "count", msg[2])
+                if msg[1] == self.current_session_key:
+                    self.status_label.configure(text=f"Undone (#{msg[2]})", text_color="orange")
+                    self.show_notification(f"Undone #{msg[2]}", msg[3])
+
+        elif action == "REDO":
+            if msg[1] in self.active_sessions:
+                self.session_tree.set(msg[1], "count", msg[2])
+                if msg[1] == self.current_session_key:
+                    self.status_label.configure(text=f"Redone (#{msg[2]})", text_color="orange")
+                    self.show_notification(f"Redone #{msg[2]}", msg[3])
+
+        elif action == "DUPLICATE":
+            if msg[1] == self.current_session_key:
+                self.show_notification("Screen unchanged", "Capture skipped")
+
+        elif action == "QUEUE":
+            # msg[1] = session_id, msg[2] = pending frames, msg[3] = bytes in memory, msg[4] = bytes on disk
+            if msg[1] == self.current_session_key:
+                self.update_queue_label(msg[2], msg[3], msg[4])
+
+        elif action == "RESUME_COUNT":
+            # msg[1] = file_path, msg[2] = picture count (None if unreadable)
+            self.resume_word_file(msg[1], msg[2])
+
+        elif action == "METRICS":
+            # msg[1] = session_id, msg[2] = {stage: (p50, p95, p99) in ms}
+            if msg[1] == self.current_session_key:
+                self.update_metrics_label(msg[2])
+
+        elif action == "WARNING":
+            messagebox.showwarning(msg[1], msg[2])
+
+        elif action == "HOTKEY_FAIL":
+            messagebox.showerror("Hotkey Error",
+                                 f"Could not register: {msg[1]}\nClose other apps using this key.")
+
+        elif action == "COPY_PROGRESS":
+            # msg[1] = current, msg[2] = total
+            self.status_label.configure(text=f"Copying to Clipboard... ({msg[1]}/{msg[2]})",
+                                        text_color="orange")
+            if msg[1] == msg[2]:
+                self.show_notification("Copied!", "")
+                self.update_status_label()
+
+        elif action == "UPDATE_FILENAME":
+            # msg[1] = session_id, msg[2] = new_filepath
+            session_key = msg[1]
+            new_path = msg[2]
+            if session_key in self.active_sessions:
+                base = os.path.basename(new_path)
+                match = re.search(r"_Part(\d+)\.docx$", base)
+                if match:
+                    part_num = match.group(1)
+                    # Update tree item text
+                    orig_name = os.path.basename(session_key)
+                    # Remove extension from original name if present for display
+                    if orig_name.lower().endswith('.docx'):
+                        orig_name = orig_name[:-5]
+
+                    display_name = f"{orig_name} (Part {part_num})"
+                    self.session_tree.item(session_key, text=display_name)
+
+                    # Update status label if this is the current session
+                    if session_key == self.current_session_key:
+                        self.status_label.configure(text=f"Switched to Part {part_num}",
+                                                    text_color=self.colors["accent"])
+
+        elif action == "RECOVERED":
+            # msg[1] = document, msg[2] = captures replayed from its journal
+            self.show_notification("Recovered after crash",
+                                   f"{msg[2]} capture{'s' if msg[2] != 1 else ''} in {os.path.basename(msg[1])}")
+
+        elif action == "RECOVERY_DONE":
+            if not self.current_session_key:
+                self.status_label.configure(text="Ready to capture", text_color=self.colors["text_secondary"])
+
+        elif action == "COMPACTED":
+            # msg[1] = session_id, msg[2] = document, msg[3] = size reclaimed
+            self.show_notification("Unused images removed", f"{os.path.basename(msg[2])}: {msg[3]}")
+
+        elif action == "COPIED":
+            self.show_notification("Copied!", "")
+        elif action == "COPY_FILES_NOT_SUPPORTED":
+            self.show_notification("Files cannot be copied", "Only text can be copied")
+        elif action == "CLIPBOARD_ERROR":
+            messagebox.showerror("Clipboard Error",
+                                 "Could not access the clipboard.\nPlease close other apps that might be locking it and try again.")
 
     def on_close(self):
         if self.active_sessions:
@@ -937,12 +1138,27 @@ class ModernUI(ctk.CTk):
         if self.hotkey_manager:
             self.hotkey_manager.stop()
 
-        for session in self.active_sessions.values():
+        # Sessions keep reporting while they finish; nothing may try to wake the closing GUI
+        self.gui_queue.wake = None
+        sessions = list(self.active_sessions.values())
+        for session in sessions:
             session.cleanup()
+        shutdown_encoder_pool()
+        # Not a daemon, so the shared workers are stopped only after every session has saved
+        threading.Thread(target=self._shutdown_workers, args=(sessions,)).start()
 
         self.destroy()
 
+    @staticmethod
+    def _shutdown_workers(sessions):
+        for session in sessions:
+            if session.finish_thread:
+                session.finish_thread.join()
+        shutdown_session_executor()
+
 
 if __name__ == "__main__":
+    # Required for the encoder worker processes in frozen builds
+    multiprocessing.freeze_support()
     app = ModernUI()
     app.mainloop()
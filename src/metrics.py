@@ -0,0 +1,107 @@
+import datetime
+import json
+import math
+import platform
+import threading
+from typing import Dict, Optional, Tuple
+
+# Stages of a capture, in pipeline order. "total" runs from the hotkey to the
+# post-save notification.
+STAGES = ("hotkey", "grab", "title", "queue_wait", "encode", "add_picture", "save", "clipboard", "total")
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram. Each bucket is 5% wider than the one
+    before, so percentiles are accurate to about 5% in constant memory.
+    """
+
+    GROWTH = 1.05
+    MIN_SECONDS = 1e-5
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+
+    def record(self, seconds: float):
+        if seconds <= self.MIN_SECONDS:
+            index = 0
+        else:
+            index = int(math.log(seconds / self.MIN_SECONDS, self.GROWTH)) + 1
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+
+    def percentile(self, p: float) -> float:
+        """Upper bound, in seconds, of the bucket holding the p-th percentile."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return self.MIN_SECONDS * self.GROWTH ** index
+        return 0.0
+
+
+class CaptureTiming:
+    """Stage durations of one capture, finished once every consumer is done."""
+
+    __slots__ = ("capture", "started", "enqueued", "stages", "pending")
+
+    def __init__(self, capture: int, started: float, consumers: int):
+        self.capture = capture
+        self.started = started
+        self.enqueued = started
+        self.stages: Dict[str, float] = {}
+        self.pending = consumers
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+
+class SessionMetrics:
+    """
+    Per-session latency histograms for each capture stage.
+    Finished captures are also appended to a JSON-lines file when a path is set.
+    """
+
+    def __init__(self, session_name: str, path: Optional[str] = None):
+        self.session_name = session_name
+        self.path = path
+        self.host = platform.node()
+        self.histograms = {stage: LatencyHistogram() for stage in STAGES}
+        self._lock = threading.Lock()
+
+    def finish(self, timing: CaptureTiming) -> bool:
+        """Called by each consumer; returns True once the capture has been recorded."""
+        with self._lock:
+            timing.pending -= 1
+            if timing.pending > 0:
+                return False
+            for stage, seconds in timing.stages.items():
+                if stage in self.histograms:
+                    self.histograms[stage].record(seconds)
+            if self.path:
+                self._write(timing)
+        return True
+
+    def summary(self) -> Dict[str, Tuple[float, float, float]]:
+        """p50, p95 and p99 in milliseconds for every stage with samples."""
+        with self._lock:
+            return {stage: tuple(h.percentile(p) * 1000 for p in (50, 95, 99))
+                    for stage, h in self.histograms.items() if h.count}
+
+    def _write(self, timing: CaptureTiming):
+        record = {
+            "ts": datetime.datetime.now().isoformat(timespec="milliseconds"),
+            "host": self.host,
+            "session": self.session_name,
+            "capture": timing.capture,
+            "ms": {stage: round(seconds * 1000, 3) for stage, seconds in timing.stages.items()},
+        }
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(f"Metrics Error: {e}")
@@ -0,0 +1,118 @@
+import queue
+import threading
+from typing import Callable, List, Optional
+
+# Threads shared by every session's save and clipboard queues
+SESSION_WORKERS = 4
+
+
+class SessionExecutor:
+    """
+    A fixed set of threads that run the I/O work of every session.
+
+    Threads block on a queue of session queues that have work waiting, so
+    idle and paused sessions cost no wakeups at all. A session queue is run
+    by at most one thread at a time, which keeps each session's tasks in order.
+    """
+
+    def __init__(self, workers: int = SESSION_WORKERS):
+        self.workers = workers
+        self._ready = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        for _ in range(workers):
+            thread = threading.Thread(target=self._worker, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def schedule(self, session_queue: "SessionQueue"):
+        self._ready.put(session_queue)
+
+    def _worker(self):
+        while True:
+            session_queue = self._ready.get()
+            if session_queue is None:
+                break
+            session_queue.run(self)
+
+    def has_waiting(self) -> bool:
+        """True when another session queue is waiting for a thread."""
+        return not self._ready.empty()
+
+    def shutdown(self, wait: bool = True):
+        """Stops the threads once the queues scheduled so far have run."""
+        for _ in self._threads:
+            self._ready.put(None)
+        if wait:
+            for thread in self._threads:
+                if thread is not threading.current_thread():
+                    thread.join()
+
+
+class SessionQueue(queue.Queue):
+    """
+    One session's queue of tasks of one kind, run on the shared executor.
+
+    The first put schedules the queue; the thread that picks it up passes
+    items to handler until the queue is empty and then lets go of it.
+    The handler may take more items itself, e.g. to batch them.
+    """
+
+    def __init__(self, handler: Callable):
+        super().__init__()
+        self.handler = handler
+        self._schedule_lock = threading.Lock()
+        self._scheduled = False
+        # Set while no thread holds or is about to hold this queue
+        self.idle = threading.Event()
+        self.idle.set()
+
+    def put(self, item, block=True, timeout=None):
+        super().put(item, block, timeout)
+        with self._schedule_lock:
+            if self._scheduled:
+                return
+            self._scheduled = True
+            self.idle.clear()
+        get_session_executor().schedule(self)
+
+    def run(self, executor: SessionExecutor):
+        while True:
+            try:
+                item = self.get_nowait()
+            except queue.Empty:
+                with self._schedule_lock:
+                    if self.empty():
+                        self._scheduled = False
+                        self.idle.set()
+                        return
+                continue
+            self.handler(item)
+            if executor.has_waiting() and not self.empty():
+                # Let other sessions' work run before this queue's next item
+                executor.schedule(self)
+                return
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Waits until every item put so far has been handled."""
+        return self.idle.wait(timeout)
+
+
+_executor: Optional[SessionExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_session_executor() -> SessionExecutor:
+    """Returns the process-wide session executor, starting it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = SessionExecutor()
+        return _executor
+
+
+def shutdown_session_executor(wait: bool = True):
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait)